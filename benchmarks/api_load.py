@@ -0,0 +1,118 @@
+import json
+import os
+import statistics
+import threading
+import time
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests_toolbelt.multipart.encoder import MultipartEncoder
+
+
+class ZeroFile:
+    def __init__(self, size: int):
+        self.len = size
+        self.sent = 0
+
+    def read(self, size: int = -1) -> bytes:
+        if size < 0:
+            size = self.len
+        size = min(size, self.len)
+        self.len -= size
+        self.sent += size
+        return bytes(size)
+
+
+def large_upload(address: str, size: int, done: threading.Event) -> float:
+    fields = {
+        "location": json.dumps(["backup", "hop_load_test"]),
+        "uuid": json.dumps(False),
+        "file": ("large.bin", ZeroFile(size), "application/octet-stream"),
+    }
+    encoder = MultipartEncoder(fields=fields)
+    start = time.perf_counter()
+    try:
+        requests.post(
+            f"{address}/upload",
+            data=encoder,
+            headers={"Content-Type": encoder.content_type},
+        )
+    finally:
+        done.set()
+    return time.perf_counter() - start
+
+
+def small_request(session: requests.Session, address: str) -> float:
+    start = time.perf_counter()
+    session.post(
+        f"{address}/delete",
+        data={"location": json.dumps(["backup", "hop_load_test", "missing"])},
+    )
+    return time.perf_counter() - start
+
+
+def sample(address: str, concurrency: int, stop: threading.Event) -> list:
+    latencies = []
+
+    def worker():
+        session = requests.Session()
+        while not stop.is_set():
+            latencies.append(small_request(session, address))
+
+    with ThreadPoolExecutor(concurrency) as executor:
+        for _ in range(concurrency):
+            executor.submit(worker)
+    return latencies
+
+
+def report(label: str, latencies: list) -> None:
+    latencies = sorted(latencies)
+    if not latencies:
+        print(f"{label}: no requests completed")
+        return
+    p95 = latencies[int(len(latencies) * 0.95) - 1 if len(latencies) > 1 else 0]
+    print(
+        f"{label:<16} {len(latencies):>6} requests  "
+        f"p50 {statistics.median(latencies) * 1000:>8.2f} ms  "
+        f"p95 {p95 * 1000:>8.2f} ms  "
+        f"max {latencies[-1] * 1000:>8.2f} ms"
+    )
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(
+        description="Measure small request latency while a large upload is running"
+    )
+    parser.add_argument(
+        "--address",
+        default=os.environ.get("API_ADDRESS", "http://localhost:8000"),
+        help="hop_api address (default: API_ADDRESS)",
+    )
+    parser.add_argument(
+        "--size", type=float, default=4, help="Size of the large upload in GB"
+    )
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument(
+        "--baseline", type=float, default=5, help="Seconds to sample with no upload"
+    )
+    args = parser.parse_args()
+
+    stop = threading.Event()
+    timer = threading.Timer(args.baseline, stop.set)
+    timer.start()
+    report("idle", sample(args.address, args.concurrency, stop))
+
+    done = threading.Event()
+    upload = threading.Thread(
+        target=large_upload,
+        args=(args.address, int(args.size * 1024**3), done),
+        daemon=True,
+    )
+    start = time.perf_counter()
+    upload.start()
+    report("during upload", sample(args.address, args.concurrency, done))
+    print(f"{args.size} GB upload took {time.perf_counter() - start:.1f} s")
+    requests.post(
+        f"{args.address}/delete",
+        data={"location": json.dumps(["backup", "hop_load_test", "large.bin"])},
+    )
@@ -0,0 +1,80 @@
+import hashlib
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+from hop.util import MultiProcess
+
+
+def tiny(count: int) -> list:
+    return [(f"/bench/{index}/frame.exr",) for index in range(count)]
+
+
+def cpu(count: int) -> list:
+    return [("sha256", b"hop", str(index).encode(), 20_000) for index in range(count)]
+
+
+def io(count: int, root: str, size: int = 1024 * 1024) -> list:
+    source = os.path.join(root, "source.bin")
+    with open(source, "wb") as f:
+        f.write(os.urandom(size))
+    return [(source, os.path.join(root, f"copy_{index}.bin")) for index in range(count)]
+
+
+def run(function, args: list, repeat: int, **options) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = MultiProcess(function, args, **options).execute().retrieve()
+        times.append(time.perf_counter() - start)
+        assert len(results) == len(args)
+    return statistics.median(times)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(
+        description="Compare MultiProcess chunk sizes, worker counts and pools"
+    )
+    parser.add_argument("--tasks", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--interpreter", default=sys.executable)
+    parser.add_argument("--persistent", action="store_true")
+    parser.add_argument(
+        "--chunksizes", type=int, nargs="*", default=[1, 16, 256], help="0 is auto"
+    )
+    parser.add_argument("--workers", type=int, nargs="*", default=[0], help="0 is auto")
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="hop_chunksize_")
+    try:
+        workloads = (
+            ("tiny", os.path.basename, tiny(args.tasks)),
+            ("cpu", hashlib.pbkdf2_hmac, cpu(max(args.tasks // 50, 1))),
+            ("io", shutil.copyfile, io(max(args.tasks // 10, 1), root)),
+        )
+        for name, function, tasks in workloads:
+            for io_bound in (False, True):
+                for workers in args.workers:
+                    for chunksize in [*args.chunksizes, 0]:
+                        seconds = run(
+                            function,
+                            tasks,
+                            args.repeat,
+                            interpreter=args.interpreter,
+                            persistent=args.persistent,
+                            max_workers=workers or None,
+                            chunksize=chunksize or None,
+                            io_bound=io_bound,
+                        )
+                        print(
+                            f"{name:>4} x{len(tasks):<6}"
+                            f" {'threads' if io_bound else 'processes':>9}"
+                            f" workers {workers or 'auto':>4}"
+                            f" chunksize {chunksize or 'auto':>4}:"
+                            f" {seconds * 1000:8.1f} ms"
+                        )
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
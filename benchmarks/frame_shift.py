@@ -0,0 +1,68 @@
+import os
+import shutil
+import tempfile
+import time
+from argparse import ArgumentParser
+from glob import glob
+from pathlib import Path
+from hop.util import frame_shifter
+from hop.util.walker import walk
+
+PATTERN = "plate.*.exr"
+
+
+def shift_old(start_folder: str, pattern: str, start: int) -> int:
+    renames = 0
+    for current in os.walk(start_folder):
+        folder = Path(current[0])
+        files = sorted(glob(str(folder / pattern)))
+        if files:
+            temp_names = [
+                folder / f"tmp_{pattern.replace('*', str(i))}"
+                for i in range(len(files))
+            ]
+            for temp_name, back_plate in zip(temp_names, files):
+                os.rename(back_plate, temp_name)
+            for count, temp_name in enumerate(temp_names):
+                os.rename(temp_name, folder / pattern.replace("*", str(start + count)))
+            renames += 2 * len(files)
+    return renames
+
+
+def shift_new(start_folder: str, pattern: str, start: int) -> int:
+    renames = 0
+    for folder, files in walk(start_folder):
+        names = [entry.name for entry in files]
+        plan = frame_shifter.plan_folder(folder, names, pattern, start)
+        frame_shifter.run_plan(folder, plan)
+        renames += len(plan)
+    return renames
+
+
+def build(root: str, folders: int, frames: int, first: int) -> None:
+    for folder in range(folders):
+        path = os.path.join(root, f"shot_{folder}")
+        os.makedirs(path)
+        for frame in range(first, first + frames):
+            open(os.path.join(path, PATTERN.replace("*", str(frame))), "wb").close()
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Compare frame_shifter against double renames")
+    parser.add_argument("--frames", type=int, default=10_000)
+    parser.add_argument("--folders", type=int, default=1)
+    parser.add_argument("--first", type=int, default=1)
+    parser.add_argument("--start", type=int, default=1001)
+    parser.add_argument("--root", help="Folder to build the sequences in")
+    args = parser.parse_args()
+
+    for name, function in (("temp names", shift_old), ("planner", shift_new)):
+        root = tempfile.mkdtemp(prefix="hop_frame_shift_", dir=args.root)
+        try:
+            build(root, args.folders, args.frames, args.first)
+            start = time.perf_counter()
+            renames = function(root, PATTERN, args.start)
+            seconds = time.perf_counter() - start
+            print(f"{name:>10}: {renames} renames in {seconds:.3f}s")
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
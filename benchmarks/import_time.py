@@ -0,0 +1,73 @@
+import os
+import subprocess
+import sys
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def find_modules(package: str = "hop") -> list:
+    modules = []
+    for path in sorted((ROOT / package).rglob("*.py")):
+        parts = list(path.relative_to(ROOT).with_suffix("").parts)
+        if "plugins" in parts:
+            continue
+        if parts[-1] == "__init__":
+            parts.pop()
+        modules.append(".".join(parts))
+    return modules
+
+
+def time_import(module: str, interpreter: str) -> tuple:
+    env = os.environ.copy()
+    env["PYTHONPATH"] = os.pathsep.join(
+        [str(ROOT)] + [p for p in env.get("PYTHONPATH", "").split(os.pathsep) if p]
+    )
+    start = time.perf_counter()
+    result = subprocess.run(
+        [interpreter, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        env=env,
+    )
+    wall = time.perf_counter() - start
+    cumulative = None
+    error = None
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:"):
+            fields = [field.strip() for field in line[12:].split("|")]
+            if fields[-1] == module:
+                cumulative = int(fields[1]) / 1e6
+        elif line.strip():
+            error = line.strip()
+    if result.returncode != 0:
+        return None, wall, error
+    return cumulative, wall, None
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(
+        description="Report the import cost of every hop module in a bare interpreter"
+    )
+    parser.add_argument("modules", nargs="*", help="Modules to time (default: all)")
+    parser.add_argument(
+        "--interpreter",
+        default=sys.executable,
+        help="Python interpreter to run the imports with",
+    )
+    args = parser.parse_args()
+
+    rows = []
+    for module in args.modules or find_modules():
+        cumulative, wall, error = time_import(module, args.interpreter)
+        rows.append((module, cumulative, wall, error))
+
+    width = max(len(row[0]) for row in rows)
+    print(f"{'module':<{width}}  {'import (s)':>10}  {'process (s)':>11}")
+    for module, cumulative, wall, error in sorted(rows, key=lambda row: -(row[1] or 0)):
+        if cumulative is None:
+            print(f"{module:<{width}}  {'failed':>10}  {wall:>11.3f}  {error}")
+        else:
+            print(f"{module:<{width}}  {cumulative:>10.3f}  {wall:>11.3f}")
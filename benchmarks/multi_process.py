@@ -0,0 +1,41 @@
+import os
+import statistics
+import sys
+import time
+from argparse import ArgumentParser
+from hop.util import MultiProcess
+
+
+def run(tasks: int, persistent: bool, interpreter: str) -> float:
+    args = [(f"/bench/{count}/frame.exr",) for count in range(tasks)]
+    start = time.perf_counter()
+    results = (
+        MultiProcess(
+            os.path.basename, args, interpreter=interpreter, persistent=persistent
+        )
+        .execute()
+        .retrieve()
+    )
+    seconds = time.perf_counter() - start
+    assert len(results) == tasks
+    return seconds
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Compare cold and warm MultiProcess latency")
+    parser.add_argument("--tasks", type=int, nargs="*", default=[1, 10, 1000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--interpreter", default=sys.executable)
+    args = parser.parse_args()
+
+    # The first persistent call starts the service, which is reported apart
+    print(f"service start: {run(1, True, args.interpreter) * 1000:.1f} ms")
+    for tasks in args.tasks:
+        for name, persistent in (("cold", False), ("warm", True)):
+            times = [
+                run(tasks, persistent, args.interpreter) for _ in range(args.repeat)
+            ]
+            print(
+                f"{tasks:>5} tasks {name}: median {statistics.median(times) * 1000:.1f}"
+                f" ms, min {min(times) * 1000:.1f} ms"
+            )
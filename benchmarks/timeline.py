@@ -0,0 +1,96 @@
+import os
+import random
+import time
+from argparse import ArgumentParser
+from pymongo import MongoClient
+from hop.util import timeline
+
+
+def aggregate_find_shot(collection, start: int, end: int) -> dict:
+    return list(
+        collection.aggregate([
+            {
+                "$addFields": {
+                    "range_diff": {
+                        "$abs": {
+                            "$subtract": [
+                                {"$subtract": ["$end_frame", "$start_frame"]},
+                                {"$subtract": [end, start]},
+                            ]
+                        }
+                    },
+                    "proximity_score": {
+                        "$add": [
+                            {"$abs": {"$subtract": ["$start_frame", start]}},
+                            {"$abs": {"$subtract": ["$end_frame", end]}},
+                        ]
+                    },
+                }
+            },
+            {"$sort": {"proximity_score": 1, "range_diff": 1}},
+            {"$limit": 1},
+        ])
+    )[0]
+
+
+def scan_overlapping(collection, start: int, end: int) -> list:
+    return [
+        shot
+        for shot in collection.find({})
+        if max(start, shot["start_frame"]) <= min(end, shot["end_frame"])
+    ]
+
+
+def populate(collection, count: int, seed: int) -> int:
+    random.seed(seed)
+    collection.drop()
+    frame = 1001
+    shots = []
+    for number in range(1, count + 1):
+        length = random.randint(24, 240)
+        shots.append({
+            "shot_number": number,
+            "start_frame": frame,
+            "end_frame": frame + length,
+        })
+        frame += length + 1
+    collection.insert_many(shots)
+    return frame
+
+
+def measure(label: str, function, queries: list) -> float:
+    start = time.perf_counter()
+    for query in queries:
+        function(*query)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<32} {elapsed / len(queries) * 1000:>9.3f} ms/query")
+    return elapsed
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Benchmark shot timeline queries")
+    parser.add_argument(
+        "--address",
+        default=os.environ.get("MONGO_ADDRESS", "mongodb://localhost:27017"),
+        help="Mongo server to benchmark against (default: MONGO_ADDRESS)",
+    )
+    parser.add_argument("--shots", type=int, default=10000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    client = MongoClient(args.address)
+    collection = client["hop_benchmark"]["shots"]
+    last_frame = populate(collection, args.shots, args.seed)
+    queries = []
+    for _ in range(args.queries):
+        start = random.randint(1001, last_frame)
+        queries.append((collection, start, start + random.randint(24, 240)))
+
+    print(f"{args.shots} shots, {args.queries} queries")
+    measure("aggregate find_shot", aggregate_find_shot, queries)
+    measure("full scan overlap", scan_overlapping, queries)
+    timeline.ensure_indexes(collection)
+    measure("timeline.find_nearest", timeline.find_nearest, queries)
+    measure("timeline.find_overlapping", timeline.find_overlapping, queries)
+    client.drop_database("hop_benchmark")
@@ -0,0 +1,85 @@
+import os
+import shutil
+import tempfile
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+from hop.util.walker import IgnoreRules, walk
+
+IGNORE_FOLDER_NAMES = ["cache", "__pycache__"]
+IGNORE_FILE_TYPES = [".tmp"]
+IGNORE_FOLDERS = ["renders"]
+
+
+def build_tree(root: str, files: int, per_folder: int) -> None:
+    kinds = ["shots", "assets", "cache", "renders", "__pycache__"]
+    for count in range(files):
+        index = count // per_folder
+        folder = os.path.join(
+            root, kinds[index % len(kinds)], f"group_{index // 10}", f"folder_{index}"
+        )
+        if count % per_folder == 0:
+            os.makedirs(folder, exist_ok=True)
+        extension = ".tmp" if count % 7 == 0 else ".exr"
+        open(os.path.join(folder, f"file_{count}{extension}"), "wb").close()
+
+
+def walk_old(start_folder: str) -> int:
+    ignore_paths = [Path(start_folder) / ignore for ignore in IGNORE_FOLDERS]
+    kept = 0
+    for folder, _, files in os.walk(start_folder):
+        folder_parts = [part.lower() for part in Path(folder).parts]
+        if any(name.lower() in folder_parts for name in IGNORE_FOLDER_NAMES):
+            continue
+        for file in files:
+            path = Path(folder) / file
+            if any(
+                path == ignore or path.is_relative_to(ignore) for ignore in ignore_paths
+            ):
+                continue
+            if any(file.lower().endswith(ext.lower()) for ext in IGNORE_FILE_TYPES):
+                continue
+            os.stat(str(path))
+            kept += 1
+    return kept
+
+
+def walk_new(start_folder: str) -> int:
+    rules = IgnoreRules(IGNORE_FOLDERS, IGNORE_FOLDER_NAMES, IGNORE_FILE_TYPES)
+    kept = 0
+    for _, files in walk(start_folder, rules):
+        for entry in files:
+            entry.stat()
+            kept += 1
+    return kept
+
+
+def timed(function, start_folder: str, repeat: int) -> tuple[float, int]:
+    best, result = float("inf"), 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(start_folder)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Compare os.walk against the pruning walker")
+    parser.add_argument("--files", type=int, default=500_000)
+    parser.add_argument("--per-folder", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--root", help="Existing tree to walk instead of a new one")
+    args = parser.parse_args()
+
+    root = args.root or tempfile.mkdtemp(prefix="hop_walk_")
+    try:
+        if not args.root:
+            start = time.perf_counter()
+            build_tree(root, args.files, args.per_folder)
+            print(f"Built {args.files} files in {time.perf_counter() - start:.1f}s")
+        for name, function in (("os.walk", walk_old), ("walker", walk_new)):
+            seconds, kept = timed(function, root, args.repeat)
+            print(f"{name:>8}: {seconds:.3f}s for {kept} files")
+    finally:
+        if not args.root:
+            shutil.rmtree(root, ignore_errors=True)
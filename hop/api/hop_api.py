@@ -1,37 +1,52 @@
 import os
-import shutil
 from pathlib import Path
 from uuid import uuid4
 import json
-from fastapi import FastAPI, UploadFile, Request
+from fastapi import FastAPI, HTTPException, UploadFile, Request
 from fastapi.staticfiles import StaticFiles
 import uvicorn
 import aiohttp
 from discord import Webhook
 import logging
+from contextlib import asynccontextmanager
+from storage import LocalStorage, read_chunks
 
 logging.basicConfig(level=logging.INFO)
-app = FastAPI()
+storage = LocalStorage()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Blobs whose last path entry was removed without a readable hash tag
+    removed = await storage.sweep()
+    if removed:
+        logging.info(f"Freed {removed} unreferenced blobs")
+    removed = await storage.sweep_sessions()
+    if removed:
+        logging.info(f"Removed {removed} abandoned upload sessions")
+    yield
+
+
+app = FastAPI(lifespan=lifespan)
 os.makedirs("static_files", exist_ok=True)
 app.mount("/static_files", StaticFiles(directory="static_files"), name="static_files")
+os.makedirs("backup", exist_ok=True)
+app.mount("/backup", StaticFiles(directory="backup"), name="backup")
 
 
-def upload_file(uploaded_file: UploadFile, location: list, uuid: bool):
+def entry_name(filename: str | None, uuid: bool) -> str:
     if uuid is True:
-        dir = os.path.basename(str(uploaded_file.filename).replace('\\', '/'))
-        file_name = f"{uuid4()}-{dir}"
-    else:
-        file_name = Path(str(uploaded_file.filename)).name
+        dir = os.path.basename(str(filename).replace('\\', '/'))
+        return f"{uuid4()}-{dir}"
+    return Path(str(filename)).name
 
-    save_path = "."
-    for i in location + [file_name]:
-        save_path = os.path.join(save_path, i)
-    os.makedirs(os.path.dirname(save_path), exist_ok=True)
 
+async def upload_file(uploaded_file: UploadFile, location: list, uuid: bool):
+    file_name = entry_name(uploaded_file.filename, uuid)
+
+    save_path = storage.path(location + [file_name])
     logging.info(f"Writing -> {save_path}")
-    with open(save_path, "w+b") as file:
-        shutil.copyfileobj(uploaded_file.file, file)
-    return save_path
+    return await storage.write(location + [file_name], read_chunks(uploaded_file))
 
 
 @app.post("/discord")
@@ -44,8 +59,8 @@ async def send(request: Request, file: UploadFile | None = None):
     store_message = message
     file_location = None
     if file:
-        file_location = os.environ["API_ADDRESS"] + upload_file(
-            file, ["static_files"], True
+        file_location = os.environ["API_ADDRESS"] + (
+            await upload_file(file, ["static_files"], True)
         ).lstrip(".")
 
     async with aiohttp.ClientSession() as session:
@@ -71,7 +86,117 @@ async def upload(request: Request, file: UploadFile):
         return
     location = list(json.loads(location_str))
     uuid = bool(json.loads(uuid_str))
-    return os.environ["API_ADDRESS"] + upload_file(file, location, uuid)
+    try:
+        return os.environ["API_ADDRESS"] + await upload_file(file, location, uuid)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+
+@app.post("/unpack")
+async def unpack(request: Request, file: UploadFile):
+    form = await request.form()
+    location_str = form.get("location")
+    if type(location_str) is not str:
+        raise HTTPException(400, "Missing location")
+    location = list(json.loads(location_str))
+    try:
+        saved = await storage.unpack(location, file.file)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    logging.info(f"Unpacked {len(saved)} files -> {storage.path(location)}")
+    # Keyed by member name, so the client only records what was stored
+    return {
+        name: os.environ["API_ADDRESS"] + save_path for name, save_path in saved.items()
+    }
+
+
+@app.get("/blobs/{digest}")
+async def has_blob(digest: str):
+    try:
+        return {"hash": digest, "exists": await storage.has_blob(digest)}
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+
+@app.post("/link")
+async def link(request: Request):
+    form = await request.form()
+    fields = {}
+    for key in ("location", "file_name", "hash", "uuid"):
+        if type(value := form.get(key)) is not str:
+            raise HTTPException(400, f"Missing {key}")
+        fields[key] = json.loads(value)
+    location = list(fields["location"]) + [
+        entry_name(fields["file_name"], bool(fields["uuid"]))
+    ]
+    try:
+        save_path = await storage.link(location, str(fields["hash"]))
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    if save_path is None:
+        raise HTTPException(404, f"No blob {fields['hash']}")
+    logging.info(f"Linking -> {save_path}")
+    return os.environ["API_ADDRESS"] + save_path
+
+
+@app.post("/uploads")
+async def create_upload(request: Request):
+    form = await request.form()
+    fields = {}
+    for key in ("location", "file_name", "size", "chunk_size", "uuid", "upload_id"):
+        if type(value := form.get(key)) is not str:
+            raise HTTPException(400, f"Missing {key}")
+        fields[key] = json.loads(value)
+    file_name = entry_name(fields["file_name"], fields["uuid"])
+    info = {
+        "upload_id": str(fields["upload_id"]),
+        "location": list(fields["location"]),
+        "file_name": file_name,
+        "size": int(fields["size"]),
+        "chunk_size": int(fields["chunk_size"]),
+    }
+    try:
+        return await storage.create_session(str(fields["upload_id"]), info)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+
+@app.get("/uploads/{upload_id}")
+async def upload_state(upload_id: str):
+    try:
+        state = await storage.session_state(upload_id)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    if state is None:
+        raise HTTPException(404, f"No upload session {upload_id}")
+    return state
+
+
+@app.put("/uploads/{upload_id}/{index}")
+async def upload_chunk(request: Request, upload_id: str, index: int, offset: int):
+    try:
+        committed = await storage.write_chunk(
+            upload_id, index, offset, request.stream()
+        )
+    except FileNotFoundError as e:
+        raise HTTPException(404, str(e))
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    if not committed:
+        raise HTTPException(400, f"Chunk {index} has the wrong length")
+    return {"upload_id": upload_id, "index": index}
+
+
+@app.post("/uploads/{upload_id}/finalize")
+async def finalize_upload(upload_id: str):
+    try:
+        save_path = await storage.finalize(upload_id)
+    except FileNotFoundError as e:
+        raise HTTPException(404, str(e))
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    logging.info(f"Assembled -> {save_path}")
+    return os.environ["API_ADDRESS"] + save_path
 
 
 @app.post("/delete")
@@ -81,12 +206,12 @@ async def delete(request: Request):
     if type(location_str) is not str:
         return None
     file = json.loads(location_str)
-    delete_path = file[0]
-    for i in file[1:]:
-        delete_path = os.path.join(delete_path, i)
-    if os.path.exists(delete_path):
-        logging.info(f"Removing -> {delete_path}")
-        os.remove(delete_path)
+    try:
+        deleted = await storage.delete(file)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    if deleted:
+        logging.info(f"Removing -> {storage.path(file)}")
     return file
 
 
@@ -0,0 +1,386 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import shutil
+import tarfile
+import tempfile
+import time
+from pathlib import Path
+from uuid import uuid4
+from typing import AsyncIterator
+from fastapi import UploadFile
+
+CHUNK_SIZE = 1024 * 1024
+IO_LIMIT = int(os.environ.get("HOP_API_IO_LIMIT", 8))
+# Sessions untouched for this long are abandoned, their preallocated data
+# file is freed
+SESSION_TTL = float(os.environ.get("HOP_API_SESSION_TTL", 3 * 24 * 3600))
+UPLOAD_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+DIGEST = re.compile(r"^[0-9a-f]{64}$")
+BLOB_ATTRIBUTE = "user.hop.blob"
+# mkstemp creates files readable by the owner only, uploads get the mode a
+# plain open() would give them
+UMASK = os.umask(0)
+os.umask(UMASK)
+FILE_MODE = 0o666 & ~UMASK
+
+
+# The server is deployed on its own with requirements.txt, and importing
+# hop.util would pull in pymongo and the client helpers, so the hash is
+# repeated here and has to match hop.util.hashing
+def new_hash():
+    return hashlib.blake2b(digest_size=32)
+
+
+def hash_file(path: str) -> str:
+    hasher = new_hash()
+    with open(path, "rb") as f:
+        while block := f.read(CHUNK_SIZE):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def read_digest(path: str) -> str | None:
+    # Every hardlink shares the blob's inode, so the tag set on the blob is
+    # visible from each path entry
+    try:
+        return os.getxattr(path, BLOB_ATTRIBUTE).decode()
+    except (AttributeError, OSError):
+        return None
+
+
+def tag_digest(path: str, digest: str) -> None:
+    try:
+        os.setxattr(path, BLOB_ATTRIBUTE, digest.encode())
+    except (AttributeError, OSError):
+        pass
+
+
+def write_block(file, hasher, block: bytes) -> None:
+    file.write(block)
+    hasher.update(block)
+
+
+async def read_chunks(
+    uploaded_file: UploadFile, chunk_size: int = CHUNK_SIZE
+) -> AsyncIterator[bytes]:
+    while chunk := await uploaded_file.read(chunk_size):
+        yield chunk
+
+
+class LocalStorage:
+    def __init__(
+        self,
+        root: str = ".",
+        io_limit: int = IO_LIMIT,
+        session_ttl: float = SESSION_TTL,
+    ):
+        self.root = root
+        self.uploads = os.path.join(root, ".uploads")
+        self.blobs = os.path.join(root, ".blobs")
+        self.io_limit = io_limit
+        self.session_ttl = session_ttl
+        self._semaphore = None
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        # Created on first use so it binds to the worker's running event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.io_limit)
+        return self._semaphore
+
+    def path(self, location: list) -> str:
+        save_path = self.root
+        for i in location:
+            save_path = os.path.join(save_path, i)
+        root = os.path.abspath(self.root)
+        if os.path.commonpath([root, os.path.abspath(save_path)]) != root:
+            raise ValueError(f"{save_path} is outside of {self.root}")
+        return save_path
+
+    def _open_temp(self, save_path: str):
+        directory = os.path.dirname(save_path)
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(
+            dir=directory, prefix=f".{os.path.basename(save_path)}.", suffix=".part"
+        )
+        os.chmod(temp_path, FILE_MODE)
+        return os.fdopen(fd, "wb"), temp_path
+
+    def blob_path(self, digest: str) -> str:
+        if not DIGEST.match(digest):
+            raise ValueError(f"Invalid hash {digest}")
+        return os.path.join(self.blobs, digest[:2], digest[2:4], digest)
+
+    def _link_temp(self, blob: str, save_path: str) -> str:
+        os.makedirs(os.path.dirname(save_path), exist_ok=True)
+        temp_path = os.path.join(
+            os.path.dirname(save_path),
+            f".{os.path.basename(save_path)}.{uuid4().hex}.link",
+        )
+        os.link(blob, temp_path)
+        return temp_path
+
+    def _release(self, digest: str) -> None:
+        blob = self.blob_path(digest)
+        try:
+            if os.stat(blob).st_nlink <= 1:
+                os.unlink(blob)
+        except FileNotFoundError:
+            pass
+
+    def _replace(self, temp_path: str, save_path: str) -> None:
+        previous = read_digest(save_path)
+        os.replace(temp_path, save_path)
+        if previous is not None:
+            self._release(previous)
+
+    def _commit(self, temp_path: str, digest: str, save_path: str) -> None:
+        blob = self.blob_path(digest)
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        # Another request can release the existing blob at any point, so the
+        # upload is only dropped once a link to the stored copy exists
+        while True:
+            try:
+                os.link(temp_path, blob)
+                tag_digest(blob, digest)
+            except FileExistsError:
+                try:
+                    link_path = self._link_temp(blob, save_path)
+                except FileNotFoundError:
+                    continue
+                os.unlink(temp_path)
+                temp_path = link_path
+            except OSError:
+                # Filesystems without hardlinks store every upload as a plain file
+                pass
+            break
+        self._replace(temp_path, save_path)
+
+    async def write(self, location: list, chunks: AsyncIterator[bytes]) -> str:
+        save_path = self.path(location)
+        async with self.semaphore:
+            file, temp_path = await asyncio.to_thread(self._open_temp, save_path)
+            hasher = new_hash()
+            try:
+                async for chunk in chunks:
+                    await asyncio.to_thread(write_block, file, hasher, chunk)
+                await asyncio.to_thread(file.close)
+                await asyncio.to_thread(
+                    self._commit, temp_path, hasher.hexdigest(), save_path
+                )
+            except BaseException:
+                file.close()
+                if os.path.exists(temp_path):
+                    await asyncio.to_thread(os.unlink, temp_path)
+                raise
+        return save_path
+
+    def _store(self, save_path: str, source) -> None:
+        file, temp_path = self._open_temp(save_path)
+        hasher = new_hash()
+        try:
+            with file:
+                while block := source.read(CHUNK_SIZE):
+                    write_block(file, hasher, block)
+            self._commit(temp_path, hasher.hexdigest(), save_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+
+    def _unpack(self, location: list, archive) -> dict:
+        # Members are streamed one at a time and each one is placed with the
+        # same temp file and replace as a single upload
+        saved = {}
+        base = os.path.abspath(self.path(location))
+        try:
+            with tarfile.open(fileobj=archive, mode="r|*") as tar:
+                for member in tar:
+                    if not member.isfile():
+                        continue
+                    parts = [part for part in member.name.split("/") if part]
+                    save_path = self.path(location + parts)
+                    # Members stay inside the location, away from other
+                    # uploads and the blob store
+                    if (
+                        member.name.startswith("/")
+                        or ".." in parts
+                        or os.path.commonpath([base, os.path.abspath(save_path)])
+                        != base
+                    ):
+                        raise ValueError(f"{member.name} is outside of the location")
+                    self._store(save_path, tar.extractfile(member))
+                    saved["/".join(parts)] = save_path
+        except tarfile.TarError as e:
+            raise ValueError(f"Invalid archive: {e}")
+        return saved
+
+    async def unpack(self, location: list, archive) -> dict:
+        async with self.semaphore:
+            return await asyncio.to_thread(self._unpack, location, archive)
+
+    def _link(self, digest: str, save_path: str) -> bool:
+        try:
+            temp_path = self._link_temp(self.blob_path(digest), save_path)
+        except FileNotFoundError:
+            return False
+        self._replace(temp_path, save_path)
+        return True
+
+    async def link(self, location: list, digest: str) -> str | None:
+        save_path = self.path(location)
+        async with self.semaphore:
+            if await asyncio.to_thread(self._link, digest, save_path):
+                return save_path
+        return None
+
+    async def has_blob(self, digest: str) -> bool:
+        return await asyncio.to_thread(os.path.exists, self.blob_path(digest))
+
+    def _delete(self, delete_path: str) -> bool:
+        digest = read_digest(delete_path)
+        try:
+            os.remove(delete_path)
+        except FileNotFoundError:
+            return False
+        if digest is not None:
+            self._release(digest)
+        return True
+
+    async def delete(self, location: list) -> bool:
+        delete_path = self.path(location)
+        async with self.semaphore:
+            return await asyncio.to_thread(self._delete, delete_path)
+
+    def _sweep(self) -> int:
+        removed = 0
+        for root, _, files in os.walk(self.blobs):
+            for file in files:
+                blob = os.path.join(root, file)
+                try:
+                    if os.stat(blob).st_nlink <= 1:
+                        os.unlink(blob)
+                        removed += 1
+                except FileNotFoundError:
+                    continue
+        return removed
+
+    async def sweep(self) -> int:
+        return await asyncio.to_thread(self._sweep)
+
+    async def exists(self, location: list) -> bool:
+        return await asyncio.to_thread(os.path.exists, self.path(location))
+
+    def session_path(self, upload_id: str, *parts: str) -> str:
+        if not UPLOAD_ID.match(upload_id):
+            raise ValueError(f"Invalid upload id {upload_id}")
+        return os.path.join(self.uploads, upload_id, *parts)
+
+    def _session_state(self, upload_id: str) -> dict | None:
+        try:
+            with open(self.session_path(upload_id, "info.json")) as f:
+                info = json.load(f)
+        except FileNotFoundError:
+            return None
+        chunks = os.listdir(self.session_path(upload_id, "chunks"))
+        info["committed"] = sorted(int(chunk) for chunk in chunks)
+        return info
+
+    def _session_used(self, upload_id: str) -> float:
+        # Chunk markers and writes to data keep a running upload fresh
+        used = 0.0
+        for parts in ((), ("info.json",), ("data",), ("chunks",)):
+            try:
+                used = max(used, os.stat(self.session_path(upload_id, *parts)).st_mtime)
+            except FileNotFoundError:
+                continue
+        return used
+
+    def _sweep_sessions(self) -> int:
+        try:
+            upload_ids = os.listdir(self.uploads)
+        except FileNotFoundError:
+            return 0
+        cutoff = time.time() - self.session_ttl
+        removed = 0
+        for upload_id in upload_ids:
+            if not UPLOAD_ID.match(upload_id):
+                continue
+            if self._session_used(upload_id) < cutoff:
+                shutil.rmtree(self.session_path(upload_id), ignore_errors=True)
+                removed += 1
+        return removed
+
+    async def sweep_sessions(self) -> int:
+        return await asyncio.to_thread(self._sweep_sessions)
+
+    def _create_session(self, upload_id: str, info: dict) -> dict:
+        self._sweep_sessions()
+        if (state := self._session_state(upload_id)) is not None:
+            return state
+        os.makedirs(self.session_path(upload_id, "chunks"), exist_ok=True)
+        with open(self.session_path(upload_id, "data"), "ab") as f:
+            f.truncate(info["size"])
+        temp_path = self.session_path(upload_id, "info.json.part")
+        with open(temp_path, "w") as f:
+            json.dump(info, f)
+        os.replace(temp_path, self.session_path(upload_id, "info.json"))
+        return {**info, "committed": []}
+
+    async def create_session(self, upload_id: str, info: dict) -> dict:
+        self.path(info["location"] + [info["file_name"]])
+        return await asyncio.to_thread(self._create_session, upload_id, info)
+
+    async def session_state(self, upload_id: str) -> dict | None:
+        return await asyncio.to_thread(self._session_state, upload_id)
+
+    async def write_chunk(
+        self, upload_id: str, index: int, offset: int, chunks: AsyncIterator[bytes]
+    ) -> bool:
+        info = await self.session_state(upload_id)
+        if info is None:
+            raise FileNotFoundError(f"No upload session {upload_id}")
+        expected = min(info["chunk_size"], info["size"] - offset)
+        if offset != index * info["chunk_size"] or expected <= 0:
+            raise ValueError(f"Chunk {index} does not start at offset {offset}")
+        written = 0
+        async with self.semaphore:
+            file = await asyncio.to_thread(
+                open, self.session_path(upload_id, "data"), "r+b"
+            )
+            try:
+                await asyncio.to_thread(file.seek, offset)
+                async for chunk in chunks:
+                    written += len(chunk)
+                    if written > expected:
+                        break
+                    await asyncio.to_thread(file.write, chunk)
+            finally:
+                await asyncio.to_thread(file.close)
+        if written != expected:
+            return False
+        marker = Path(self.session_path(upload_id, "chunks", str(index)))
+        await asyncio.to_thread(marker.touch)
+        return True
+
+    def _finalize(self, upload_id: str) -> str:
+        info = self._session_state(upload_id)
+        if info is None:
+            raise FileNotFoundError(f"No upload session {upload_id}")
+        chunk_count = max(-(-info["size"] // info["chunk_size"]), 1)
+        missing = set(range(chunk_count)) - set(info["committed"])
+        if missing and info["size"]:
+            raise ValueError(f"Upload {upload_id} is missing chunks {sorted(missing)}")
+        save_path = self.path(info["location"] + [info["file_name"]])
+        os.makedirs(os.path.dirname(save_path), exist_ok=True)
+        data_path = self.session_path(upload_id, "data")
+        self._commit(data_path, hash_file(data_path), save_path)
+        shutil.rmtree(self.session_path(upload_id), ignore_errors=True)
+        return save_path
+
+    async def finalize(self, upload_id: str) -> str:
+        async with self.semaphore:
+            return await asyncio.to_thread(self._finalize, upload_id)
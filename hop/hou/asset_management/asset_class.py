@@ -2,7 +2,7 @@ import os
 from pathlib import Path
 from pymongo.collection import ObjectId
 from hop.hou.asset_management.textures import create_hash, resolve_texture
-from hop.util import get_collection
+from hop.util.lazy import lazy_collection
 from glob import glob
 import clique
 from hop.util import MultiProcess, convert_rat
@@ -13,8 +13,8 @@ from hop.util import post
 
 
 class Asset:
-    asset_collection = get_collection("assets", "active_assets")
-    shot_collection = get_collection("shots", "active_shots")
+    asset_collection = lazy_collection("assets", "active_assets")
+    shot_collection = lazy_collection("shots", "active_shots")
     hop_root = Path(os.environ["HOP"]) / "assets"
 
     class Update:
@@ -126,6 +126,7 @@ class Asset:
 
         stepping = 1 / 4
         store_step = 0
+        process = None
 
         def call_progress():
             nonlocal store_step
@@ -157,7 +158,6 @@ class Asset:
                 )
                 call_progress()
                 # Set Convert textures
-                process = None
                 texture_keys, hashs = [], []
                 if self.asset_info["mat"] and self.textures:
                     args = []
@@ -190,7 +190,12 @@ class Asset:
                                 texture[1].replace("<UDIM>", f"{number:04}"),
                             ))
                     process = MultiProcess(
-                        convert_rat, args, interpreter=os.environ["PYTHON"]
+                        convert_rat,
+                        args,
+                        interpreter=os.environ["PYTHON"],
+                        persistent=True,
+                        # iconvert runs as its own process, so threads only wait on it
+                        io_bound=True,
                     ).execute()
                 call_progress()
 
@@ -212,7 +217,14 @@ class Asset:
 
                 # Update Mongo
                 if process:
-                    process.retrieve()
+                    with hou.InterruptableOperation(
+                        "Converting Textures", open_interrupt_dialog=True
+                    ) as texture_progress:
+                        process.retrieve(
+                            progress=lambda done, total: (
+                                texture_progress.updateProgress(done / total)
+                            )
+                        )
                     [resolve_texture(*info) for info in zip(hashs, texture_keys)]
                 if self.asset_dict:
                     if self.override == "main":
@@ -248,6 +260,8 @@ class Asset:
                 result = True
 
         except hou.OperationInterrupted:
+            if process:
+                process.cancel()
             try:
                 rmtree(str(Path(self.asset_info["branch_ver"]).parent))
             except FileNotFoundError:
@@ -269,5 +283,6 @@ class Asset:
                     {
                         "message": f":teddy_bear: **{(self.branch if self.override != 'main' else 'Main').capitalize()} {self.asset_name.capitalize()}** updated to  **V{self.store_version:02}** {shot_message}:teddy_bear: "
                     },
+                    background=True,
                 )
             return result
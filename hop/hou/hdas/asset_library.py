@@ -1,10 +1,9 @@
 from pathlib import Path
-from pxr.Usd import Stage
-from pxr import UsdShade, UsdGeom, Sdf
+from typing import TYPE_CHECKING
 from hop.hou.util import usd_helpers, error_dialog, confirmation_dialog
 import hou
 from hop.hou.asset_management import resolve_texture, create_hash
-from hop.util import get_collection
+from hop.util.lazy import lazy_collection, lazy_import
 from hop.hou.asset_management import Asset
 from pymongo.collection import ObjectId
 from shutil import rmtree
@@ -15,11 +14,18 @@ import os
 from glob import glob
 import clique
 
-collection = get_collection("assets", "active_assets")
-shot_collection = get_collection("shots", "active_shots")
+if TYPE_CHECKING:
+    from pxr.Usd import Stage
 
+UsdShade = lazy_import("pxr.UsdShade")
+UsdGeom = lazy_import("pxr.UsdGeom")
+Sdf = lazy_import("pxr.Sdf")
 
-def check_materials(stage: Stage):
+collection = lazy_collection("assets", "active_assets")
+shot_collection = lazy_collection("shots", "active_shots")
+
+
+def check_materials(stage: "Stage"):
     mats = set()
     for prim in stage.Traverse():
         if prim.IsA(UsdShade.Material):
@@ -31,7 +37,7 @@ def check_materials(stage: Stage):
     return True
 
 
-def check_prims(stage: Stage):
+def check_prims(stage: "Stage"):
     mats = set()
     for prim in stage.Traverse():
         if prim.IsA(UsdGeom.Boundable):
@@ -43,7 +49,7 @@ def check_prims(stage: Stage):
     return True
 
 
-def check_textures(stage: Stage):
+def check_textures(stage: "Stage"):
     for prim in stage.Traverse():
         if prim.IsA(UsdShade.Material):
             for node in usd_helpers.expand_stage(stage, start=prim.GetPath()):
@@ -61,7 +67,7 @@ def check_textures(stage: Stage):
     return False
 
 
-def tag_textures(stage: Stage):
+def tag_textures(stage: "Stage"):
     root = Path(hou.node("../").evalParm("mat_path")).parent
     for prim in stage.Traverse():
         if prim.IsA(UsdShade.Material):
@@ -259,6 +265,7 @@ def farm_execute(kwargs):
             {
                 "message": f":green_circle: **{(asset.branch if asset.override != 'main' else 'Main').capitalize()} {asset.asset_name.capitalize()} V{asset.store_version:02}**  started publishing {shot_message}:green_circle:"
             },
+            background=True,
         )
 
         asset.publish(node)
@@ -77,6 +77,7 @@ def local(kwargs):
             {
                 "message": f":green_circle: **{node.path()}** in **{file}** started caching :green_circle:"
             },
+            background=True,
         )
 
     with hou.InterruptableOperation("Disk Cache"):
@@ -90,6 +91,7 @@ def local(kwargs):
                     {
                         "message": f":orange_circle: **{node.path()}** in **{file}** was cancelled :orange_circle:"
                     },
+                    background=True,
                 )
             return
 
@@ -99,6 +101,7 @@ def local(kwargs):
             {
                 "message": f":checkered_flag: **{node.path()}** in **{file}** finished caching :checkered_flag:"
             },
+            background=True,
         )
 
 
@@ -188,6 +191,7 @@ def cancel(kwargs):
                     {
                         "message": f":orange_circle: **{node.path()}** in **{job_name.group()}** was cancelled :orange_circle:"
                     },
+                    background=True,
                 )
         hou.ui.displayMessage("Job cancelled", title="Disk Cache")
     node.parm("job_id").set("")
@@ -59,6 +59,7 @@ def local_render(kwargs: dict):
             {
                 "message": f":green_circle: **{node.path()}** in **{file}** started rendering :green_circle:"
             },
+            background=True,
         )
     node.parm("dirty").pressButton()
     node.parm("cook").pressButton()
@@ -141,6 +142,7 @@ def cancel(kwargs):
             {
                 "message": f":orange_circle: **{node.path()}** in **{file}** was cancelled :orange_circle:"
             },
+            background=True,
         )
     if farm_id:
         hou.ui.displayMessage("Job cancelled", title="Karma ROP")
@@ -1,9 +1,9 @@
-from hop.util import get_collection
+from hop.util.lazy import lazy_collection
 from pymongo.collection import ObjectId
 import hou
 import os
 
-collection = get_collection("shots", "active_shots")
+collection = lazy_collection("shots", "active_shots")
 
 
 def load_shot_menu() -> list:
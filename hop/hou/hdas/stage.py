@@ -224,6 +224,7 @@ def farm_cancel(kwargs: dict) -> None:
                 {
                     "message": f":orange_circle: **{shot.group(1).strip()}**'s renders were cancelled :orange_circle:"
                 },
+                background=True,
             )
         hou.ui.displayMessage("Render cancelled", title="Shot")
     node.parm("farm_id").set("")
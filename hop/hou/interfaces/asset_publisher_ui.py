@@ -21,17 +21,13 @@ from PySide2.QtWidgets import (
 
 from hop.hou.util import load_style
 from hop.util import get_collection
+from hop.util.lazy import lazy_collection
 from functools import partial
 
 
 class ShotMergeUI(QtWidgets.QWidget):
-    collection = get_collection("assets", "active_assets")
-    style_sheet = None
+    collection = lazy_collection("assets", "active_assets")
     margins = 20
-    try:
-        style_sheet = load_style()
-    except AttributeError:
-        pass
 
     def __init__(self):
         super().__init__()
@@ -39,8 +35,10 @@ class ShotMergeUI(QtWidgets.QWidget):
         self.node = None
         self.parm_map = {}
         self.make_ui()
-        if self.style_sheet:
-            self.setStyleSheet(self.style_sheet)
+        try:
+            self.setStyleSheet(load_style())
+        except AttributeError:
+            pass
 
     def make_ui(self):
         self.main_vertical.setContentsMargins(*[self.margins for _ in range(4)])
@@ -4,6 +4,12 @@ from glob import glob
 import os
 from hop.hou.interfaces import merge_shots
 from hop.hou.util import confirmation_dialog, error_dialog, alembic_helpers, expand_path
+from hop.util.timeline import (
+    find_overlapping,
+    get_logger,
+    run_transaction,
+    shift_shot_numbers,
+)
 
 if TYPE_CHECKING:
     from hop.hou.shot_management import Shot
@@ -20,45 +26,43 @@ def find_overlapping_shots(
         key: [] for key in ["cam", "plate", "st_map", "assets"]
     }
 
-    for existing_shot in shot.collection.find({}):
-        if str(existing_shot["_id"]) == str(shot.shot_data["_id"]):
-            continue
+    for existing_shot in find_overlapping(
+        shot.collection, start_frame, end_frame, exclude=shot.shot_data["_id"]
+    ):
         shot_start, shot_end = existing_shot["start_frame"], existing_shot["end_frame"]
         intersection_start, intersection_end = (
             max(start_frame, shot_start),
             min(end_frame, shot_end),
         )
-
-        if intersection_start <= intersection_end:
-            existing_shot.update({
-                "intersection_start": intersection_start,
-                "intersection_end": intersection_end,
-            })
-
-            if (
-                intersection_start == start_frame
-                and intersection_end < end_frame
-                and shot_start != start_frame
-            ):
-                existing_shot["trim_direction"] = -1  # Overlap at start
-                shots_to_trim.append(existing_shot)
-            elif (
-                intersection_end == end_frame
-                and intersection_start > start_frame
-                and shot_end != end_frame
-            ):
-                existing_shot["trim_direction"] = 1  # Overlap at end
-                shots_to_trim.append(existing_shot)
-            elif shot_start < start_frame and shot_end > end_frame:
-                error_dialog(
-                    "Update Frame Range", "Frame range is nested within existing shot"
-                )
-                return None
-            else:
-                shots_to_merge.append(existing_shot["shot_number"])
-                for key in shot_to_merge_data:
-                    value = existing_shot.get(key)
-                    shot_to_merge_data[key].append(value if value else None)
+        existing_shot.update({
+            "intersection_start": intersection_start,
+            "intersection_end": intersection_end,
+        })
+
+        if (
+            intersection_start == start_frame
+            and intersection_end < end_frame
+            and shot_start != start_frame
+        ):
+            existing_shot["trim_direction"] = -1  # Overlap at start
+            shots_to_trim.append(existing_shot)
+        elif (
+            intersection_end == end_frame
+            and intersection_start > start_frame
+            and shot_end != end_frame
+        ):
+            existing_shot["trim_direction"] = 1  # Overlap at end
+            shots_to_trim.append(existing_shot)
+        elif shot_start < start_frame and shot_end > end_frame:
+            error_dialog(
+                "Update Frame Range", "Frame range is nested within existing shot"
+            )
+            return None
+        else:
+            shots_to_merge.append(existing_shot["shot_number"])
+            for key in shot_to_merge_data:
+                value = existing_shot.get(key)
+                shot_to_merge_data[key].append(value if value else None)
 
     return shots_to_trim, (shots_to_merge, shot_to_merge_data)
 
@@ -153,17 +157,25 @@ def shot_merge(
 def update_shot_num(shot: "Shot") -> bool:
     if shot.shot_data is None:
         return False
-    shots_ahead = shot.collection.find({
-        "start_frame": {"$gt": shot.shot_data["end_frame"]}
-    }).sort("shot_number", 1)
-    shot_number = None
-    for count, ahead_shot in enumerate(shots_ahead):
-        ahead_shot_num = ahead_shot["shot_number"]
-        if count == 0:
-            shot_number = ahead_shot_num
-        shot.collection.update_one(
-            {"_id": ahead_shot["_id"]}, {"$set": {"shot_number": ahead_shot_num + 1}}
+    ahead_query = {"start_frame": {"$gt": shot.shot_data["end_frame"]}}
+
+    def shift_ahead(session) -> tuple[int | None, int]:
+        first_ahead = next(
+            shot.collection.find(ahead_query, session=session)
+            .sort("shot_number", 1)
+            .limit(1),
+            None,
         )
+        if first_ahead is None:
+            return None, 0
+        renumbered = shift_shot_numbers(shot.collection, ahead_query, 1, session)
+        return first_ahead["shot_number"], renumbered
+
+    # Reported once the transaction commits, since a retried callback runs
+    # more than once
+    shot_number, renumbered = run_transaction(shot.collection, shift_ahead)
+    if renumbered:
+        get_logger().info(f"Renumbered {renumbered} shots")
 
     if shot_number is None:
         shot_behind_cursor = (
@@ -2,13 +2,15 @@ import os
 from glob import glob
 from typing import TYPE_CHECKING
 import clique
-import OpenEXR
-import OpenImageIO as oiio
 from pathlib import Path
+from hop.util import MultiProcess, back_plate
+from hop.util.lazy import lazy_import
 from hop.hou.util import error_dialog, expand_path, alembic_helpers, confirmation_dialog
-from hop.hou.util import convert_exr
 import math
 
+OpenEXR = lazy_import("OpenEXR")
+oiio = lazy_import("OpenImageIO")
+
 if TYPE_CHECKING:
     from hop.hou.shot_management import Shot
 
@@ -32,16 +34,30 @@ def generate_back_plate(progress, shot: "Shot") -> bool:
         "back_plate",
     )
     os.makedirs(back_plate_path, exist_ok=True)
-    args = []
-    frame = 1001
-    for count, exr in enumerate(exrs):
-        output = os.path.join(back_plate_path, f"bp.{(frame + count):04d}.png")
-        if os.path.exists(output):
-            os.remove(output)
-        args.append((exr, output))
-        if not convert_exr(exr, output):
-            return False
-        progress.updateProgress(((count + 1) / len(exrs)))
+    tasks, fingerprints = back_plate.plan(
+        exrs, back_plate_path, os.environ["CAM"], os.environ["VIEW"]
+    )
+    if tasks:
+        results = (
+            MultiProcess(
+                back_plate.convert_frame,
+                tasks,
+                interpreter=os.environ["PYTHON"],
+                persistent=True,
+            )
+            .execute()
+            .retrieve(
+                progress=lambda done, total: progress.updateProgress(done / total)
+            )
+        )
+        # Failed frames are left out of the sidecar, so the next publish
+        # retries them
+        for (_, output, _, _), result in zip(tasks, results):
+            if result is not True:
+                fingerprints.pop(os.path.basename(output))
+    back_plate.write_sidecar(back_plate_path, fingerprints)
+    if len(fingerprints) < len(exrs):
+        return False
 
     shot.shot_data["back_plate"] = os.path.join(back_plate_path, "bp.$F.png").replace(
         os.environ["HOP"], "$HOP"
@@ -1,4 +1,5 @@
 import os
+from pathlib import Path
 from sys import exit
 from shutil import rmtree
 from typing import Callable
@@ -14,8 +15,11 @@ from hop.hou.shot_management.plate import (
     update_padding,
 )
 from hop.hou.util.helpers import expand_path
-from hop.util import MultiProcess, copy_file, get_collection, move_folder, post
+from hop.util import get_collection, move_folder, post
+from hop.util.ingest import ingest
+from hop.util.mover import queue_move, same_device
 from hop.hou.util import error_dialog
+from hop.util.timeline import close_shot_number_gaps, get_logger, run_transaction
 
 try:
     import hou
@@ -25,6 +29,20 @@ except ModuleNotFoundError:
     hou = import_hou()
 
 
+def rip_files(progress, files: list) -> bool:
+    # Unchanged files are skipped, so republishing a shot only copies what
+    # changed on disk
+    root = os.environ["HOP"]
+    pairs = [
+        (path, os.path.join(root, *target[:-1], f"{target[-1]}{Path(path).suffix}"))
+        for path, target in files
+    ]
+    run = ingest(
+        pairs, progress=lambda done, total: progress.updateProgress(done / total)
+    )
+    return not run.failed
+
+
 def shot_delete(
     shot_ids: ObjectId | list, shots_collection: Collection, retire: bool = True
 ) -> bool:
@@ -35,48 +53,64 @@ def shot_delete(
         return True
 
     retired_shots_collection = get_collection("shots", "retired_shots")
-    shot_number_min = None
+    retired_folder = os.path.join(os.environ["HOP"], "shots", "retired_shots")
+    removed_numbers = []
     for shot_id in shot_ids:
         existing_shot_path = os.path.join(
             os.environ["HOP"], "shots", "active_shots", str(shot_id)
         )
+        # A move across volumes is a full copy, so it is left to a background
+        # mover once the documents point at the retired shot
+        moving = False
         try:
             paths_to_move = expand_path(existing_shot_path)
             if paths_to_move is not None:
-                move_folder(paths_to_move, ["shots", "retired_shots"])
+                moving = not same_device(paths_to_move, retired_folder)
+                if not moving:
+                    move_folder(paths_to_move, ["shots", "retired_shots"])
         except Exception:
             return False
 
         shot_data = shots_collection.find_one({"_id": shot_id})
         if not shot_data:
             print(f"Shot ID {shot_id} not found in active shots collection.")
+            if moving:
+                queue_move(paths_to_move, retired_folder)
             continue
 
-        if shot_number_min is None or (
-            shot_data.get("shot_number") is not None
-            and shot_data["shot_number"] < shot_number_min
-        ):
-            shot_number_min = shot_data["shot_number"]
+        if shot_data.get("shot_number") is not None:
+            removed_numbers.append(shot_data["shot_number"])
 
         if retire:
             for key, value in shot_data.items():
                 if type(value) is str:
                     shot_data[key] = value.replace("active_shots", "retired_shots")
+            if moving:
+                shot_data["status"] = "moving"
             retired_shots_collection.insert_one(shot_data)
         shots_collection.delete_one({"_id": shot_id})
-
-    if shot_number_min is not None:
-        shots_ahead = shots_collection.find({
-            "shot_number": {"$gt": shot_number_min}
-        }).sort("shot_number", 1)
-
-        for count, ahead_shot in enumerate(shots_ahead):
-            new_shot_number = shot_number_min + count
-            shots_collection.update_one(
-                {"_id": ahead_shot["_id"]},
-                {"$set": {"shot_number": new_shot_number}},
+        if moving:
+            queue_move(
+                paths_to_move,
+                retired_folder,
+                {
+                    "database": "shots",
+                    "collection": "retired_shots",
+                    "_id": str(shot_id),
+                }
+                if retire
+                else None,
             )
 
+    if removed_numbers:
+        renumbered = run_transaction(
+            shots_collection,
+            lambda session: close_shot_number_gaps(
+                shots_collection, removed_numbers, session
+            ),
+        )
+        get_logger().info(f"Renumbered {renumbered} shots")
+
     return True
 
 
@@ -242,14 +276,7 @@ class Shot:
                     shot_dir = False
 
                 if self.rip_files:
-                    perform_step(
-                        lambda: MultiProcess(
-                            copy_file, self.rip_files, interpreter=os.environ["PYTHON"]
-                        )
-                        .execute()
-                        .retrieve(),
-                        "Copying Files",
-                    )
+                    perform_step(rip_files, "Copying Files", self.rip_files)
                 if self.shot_data["plate"] and self.new_plate:
                     perform_step(generate_back_plate, "Generating Back Plate", self)
 
@@ -270,6 +297,7 @@ class Shot:
                         {
                             "message": f":camera_with_flash: A new **Shot {self.shot_data['shot_number']}** was published at **{self.shot_data['start_frame']} - {self.shot_data['end_frame']}{description}** :camera_with_flash:"
                         },
+                        background=True,
                     )
                 else:
                     self.collection.update_one(
@@ -280,6 +308,7 @@ class Shot:
                         {
                             "message": f":camera: **Shot {self.shot_data['shot_number']}** was updated at **{self.shot_data['start_frame']} - {self.shot_data['end_frame']}{description}** :camera:"
                         },
+                        background=True,
                     )
 
                 hou.ui.displayMessage(
@@ -3,9 +3,8 @@ import sys
 from typing import Any
 from warnings import warn
 from pathlib import Path
-import numpy as np
-import OpenImageIO as oiio
-import PyOpenColorIO as ocio
+from functools import cache
+from hop.util import back_plate
 
 
 def import_hou() -> Any:
@@ -150,6 +149,7 @@ def error_dialog(title: str, text: str) -> None:
     )
 
 
+@cache
 def load_style() -> str:
     Border = hou.qt.getColor("ListBorder").name()
     ListEntry1 = hou.qt.getColor("ListEntry1").name()
@@ -225,39 +225,6 @@ def load_style() -> str:
 
 
 def convert_exr(exr_path: str, output_path: str):
-    img = oiio.ImageInput.open(exr_path)
-    if not img:
-        raise RuntimeError(f"Could not open input image: {oiio.geterror()}")
-    spec = img.spec()
-    pixels = img.read_image(format="float")
-    img.close()
-
-    config = ocio.GetCurrentConfig()
-    processor = config.getProcessor(
-        os.environ["CAM"], os.environ["VIEW"]
-    ).getDefaultCPUProcessor()
-    if pixels.shape[2] > 3:
-        rgb_pixels = pixels[..., :3]
-    else:
-        rgb_pixels = pixels
-    processor.applyRGB(rgb_pixels)
-
-    buf = oiio.ImageBuf(oiio.ImageSpec(spec.width, spec.height, 3, "float"))
-    buf.set_pixels(oiio.ROI(0, spec.width, 0, spec.height, 0, 1, 0, 3), rgb_pixels)
-    resized_buf = oiio.ImageBuf()
-    oiio.ImageBufAlgo.resize(resized_buf, buf, roi=oiio.ROI(0, 1280, 0, 720))
-    resized_pixels = resized_buf.get_pixels(oiio.FLOAT)
-    uint8_pixels = np.clip(resized_pixels * 255, 0, 255).astype(np.uint8)
-
-    output_spec = oiio.ImageSpec(1280, 720, 3, "uint8")
-    output_spec.channelnames = ["R", "G", "B"]
-    output_spec.attribute("Compression", "none")
-    out = oiio.ImageOutput.create(output_path)
-    if not out:
-        raise RuntimeError(f"Could not create output: {oiio.geterror()}")
-
-    if not out.open(output_path, output_spec):
-        raise RuntimeError(f"Could not open output: {out.geterror()}")
-    success = out.write_image(uint8_pixels)
-    out.close()
-    return success
+    return back_plate.convert_frame(
+        exr_path, output_path, os.environ["CAM"], os.environ["VIEW"]
+    )
@@ -1,9 +1,16 @@
-from pxr.Usd import Stage, Prim
-from pxr import Sdf, UsdShade
+from typing import TYPE_CHECKING
+from hop.util.lazy import lazy_import
+
+if TYPE_CHECKING:
+    from pxr.Usd import Stage, Prim
+
+Usd = lazy_import("pxr.Usd")
+Sdf = lazy_import("pxr.Sdf")
+UsdShade = lazy_import("pxr.UsdShade")
 import hou
 
 
-def expand_stage(stage: Stage, depth: int | None = None, start: str = "/") -> Prim:
+def expand_stage(stage: "Stage", depth: int | None = None, start: str = "/") -> "Prim":
     queue = [(stage.GetPrimAtPath(start), 0)]
     while queue:
         current_prim, current_depth = queue.pop(0)
@@ -13,7 +20,7 @@ def expand_stage(stage: Stage, depth: int | None = None, start: str = "/") -> Pr
         queue.extend((child, current_depth + 1) for child in current_prim.GetChildren())
 
 
-def check_default(prim: Prim) -> bool:
+def check_default(prim: "Prim") -> bool:
     for attr in prim.GetAttributes():
         if attr.GetNumTimeSamples() != 0 or attr.GetConnections():
             return False
@@ -35,7 +42,7 @@ def check_default(prim: Prim) -> bool:
     return True
 
 
-def reparent_prim(prim_path: str, destionation_path: str, stage: Stage) -> None:
+def reparent_prim(prim_path: str, destionation_path: str, stage: "Stage") -> None:
     prim = Sdf.Path(prim_path)
     destination = Sdf.Path(destionation_path)
 
@@ -53,7 +60,7 @@ def reparent_prim(prim_path: str, destionation_path: str, stage: Stage) -> None:
             raise RuntimeError(f"Failed to apply reparenting edit to {prim_path}.")
 
 
-def clean_stage(stage: Stage, force: bool = False) -> None:
+def clean_stage(stage: "Stage", force: bool = False) -> None:
     all_prims = list(expand_stage(stage))
     all_prims.reverse()
     for prim in all_prims:
@@ -81,15 +88,15 @@ def clean_stage(stage: Stage, force: bool = False) -> None:
                         break
 
 
-def normalize_path(prim: Prim, path: str):
+def normalize_path(prim: "Prim", path: str):
     if path.startswith("@") and path.endswith("@"):
         path = path[1:-1]
     path = Sdf.ComputeAssetPathRelativeToLayer(prim.GetStage().GetRootLayer(), path)
     return path
 
 
-def compare_scene(stage: Stage, file: str, time_check: bool = False) -> bool:
-    store = Stage.Open(file)
+def compare_scene(stage: "Stage", file: str, time_check: bool = False) -> bool:
+    store = Usd.Stage.Open(file)
 
     for prim in stage.Traverse():
         if prim.GetName() == "HoudiniLayerInfo":
@@ -173,7 +180,7 @@ def is_mat(prim) -> bool:
     return False
 
 
-def get_info(stage: Stage) -> dict:
+def get_info(stage: "Stage") -> dict:
     prim = stage.GetPrimAtPath("/HoudiniLayerInfo")
     attribs = prim.GetAttributes()
     data = {}
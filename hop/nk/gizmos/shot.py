@@ -3,10 +3,11 @@ import nuke
 import nuke.rotopaint as rp
 import _curvelib
 import re
-from hop.util import get_collection, find_shot
+from hop.util import find_shot
+from hop.util.lazy import lazy_collection
 from hop.util.custom_dialogue import custom_dialogue
 
-collection = get_collection("shots", "active_shots")
+collection = lazy_collection("shots", "active_shots")
 
 
 def fix_paths(filename):
@@ -1,4 +1,13 @@
-from hop.util.api_helpers import get_collection, post, find_shot
+from hop.util.api_helpers import (
+    get_collection,
+    get_client,
+    client_stats,
+    close_clients,
+    post,
+    flush,
+    post_stats,
+    find_shot,
+)
 
 from hop.util.helpers import (
     copy_file,
@@ -10,6 +19,7 @@ from hop.util.helpers import (
     convert_rat,
 )
 from hop.util.multi_process import MultiProcess
+from hop.util import timeline
 
 __all__ = [
     "MultiProcess",
@@ -20,7 +30,13 @@ __all__ = [
     "matrix_to_euler",
     "pop_dict",
     "post",
+    "flush",
+    "post_stats",
     "get_collection",
+    "get_client",
+    "client_stats",
+    "close_clients",
     "find_shot",
     "convert_rat",
+    "timeline",
 ]
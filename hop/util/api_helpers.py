@@ -1,75 +1,371 @@
+import atexit
+import hashlib
+import logging
 import os
+import tarfile
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from queue import Full, Queue
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from pymongo import MongoClient
 from pymongo.collection import Collection
 import json
 from pathlib import Path
 from requests_toolbelt.multipart.encoder import MultipartEncoder
+from hop.util.timeline import find_nearest
 
 
-def post(method: str, data: dict, file_path: str | None = None):
-    url = f"{os.environ['API_ADDRESS']}/{method}"
-    data = {key: json.dumps(value) for key, value in data.items()}
-    if file_path is None:
-        resp = requests.post(url, data=data)
-    else:
-        norm_path = os.path.normpath(file_path)
-        extra = {"source_path": json.dumps(list(Path(file_path).parts))}
-        fields = {**data, **extra}
-        with open(norm_path, "rb") as f:
-            fields["file"] = (
-                os.path.basename(file_path),
-                f,
-                "application/octet-stream",
+RETRY_STATUS = (502, 503, 504)
+RETRIES = 3
+BACKOFF = 0.5
+QUEUE_SIZE = 256
+CHUNK_SIZE = 16 * 1024 * 1024
+CHUNKED_UPLOAD_SIZE = 64 * 1024 * 1024
+UPLOAD_JOBS = 4
+PACK_SPOOL_SIZE = 16 * 1024 * 1024
+
+_session: requests.Session | None = None
+_session_lock = threading.Lock()
+_queue: Queue | None = None
+_post_stats = {
+    "queued": 0,
+    "sent": 0,
+    "failed": 0,
+    "queue_wait": 0.0,
+    "max_queue_wait": 0.0,
+    "send_time": 0.0,
+    "max_send_time": 0.0,
+}
+logger = logging.getLogger("HOP API")
+
+
+def get_session() -> requests.Session:
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_maxsize=16,
+                max_retries=Retry(
+                    total=RETRIES, read=0, status=0, backoff_factor=BACKOFF
+                ),
+            )
+            _session.mount("http://", adapter)
+            _session.mount("https://", adapter)
+    return _session
+
+
+def upload_id(file_path: str, location: list) -> str:
+    stat = os.stat(file_path)
+    key = f"{os.path.abspath(file_path)}|{location}|{stat.st_size}|{stat.st_mtime_ns}"
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _put_chunk(url: str, file_path: str, offset: int, chunk_size: int) -> None:
+    session = get_session()
+    for attempt in range(RETRIES + 1):
+        with open(file_path, "rb") as f:
+            f.seek(offset)
+            body = f.read(chunk_size)
+        resp = session.put(url, params={"offset": offset}, data=body)
+        if resp.status_code not in RETRY_STATUS or attempt == RETRIES:
+            break
+        time.sleep(BACKOFF * 2**attempt)
+    resp.raise_for_status()
+
+
+def upload_chunked(data: dict, file_path: str, jobs: int = UPLOAD_JOBS):
+    address = os.environ["API_ADDRESS"]
+    session = get_session()
+    size = os.path.getsize(file_path)
+    resp = session.post(
+        f"{address}/uploads",
+        data={
+            **data,
+            "file_name": json.dumps(os.path.basename(file_path)),
+            "size": json.dumps(size),
+            "chunk_size": json.dumps(CHUNK_SIZE),
+            "upload_id": json.dumps(upload_id(file_path, json.loads(data["location"]))),
+        },
+    )
+    resp.raise_for_status()
+    state = resp.json()
+    # An existing session keeps the chunk size it was created with
+    chunk_size = state["chunk_size"]
+    upload_url = f"{address}/uploads/{state['upload_id']}"
+    committed = set(state["committed"])
+    pending = [
+        index for index in range(-(-size // chunk_size)) if index not in committed
+    ]
+    with ThreadPoolExecutor(jobs) as executor:
+        list(
+            executor.map(
+                lambda index: _put_chunk(
+                    f"{upload_url}/{index}", file_path, index * chunk_size, chunk_size
+                ),
+                pending,
             )
-            encoder = MultipartEncoder(fields=fields)
-            headers = {"Content-Type": encoder.content_type}
-            resp = requests.post(url, data=encoder, headers=headers)
+        )
+    resp = session.post(f"{upload_url}/finalize")
+    resp.raise_for_status()
     return resp.json()
 
 
+def upload_pack(location: list, files: list) -> list:
+    # Many small files go up as one tar request, which the server unpacks into
+    # location using each member's relative name
+    url = f"{os.environ['API_ADDRESS']}/unpack"
+    session = get_session()
+    packed = []
+    with tempfile.SpooledTemporaryFile(PACK_SPOOL_SIZE) as archive:
+        with tarfile.open(fileobj=archive, mode="w") as tar:
+            for file_path, name in files:
+                # Symlinks and hardlinks go in as the regular files they point
+                # to, the server only unpacks regular members
+                try:
+                    with open(file_path, "rb") as f:
+                        stat = os.fstat(f.fileno())
+                        info = tarfile.TarInfo(name)
+                        info.size = stat.st_size
+                        info.mtime = stat.st_mtime
+                        info.mode = stat.st_mode & 0o7777
+                        tar.addfile(info, f)
+                except OSError as e:
+                    logger.warning(f"Unable to pack {file_path}: {e}")
+                    continue
+                packed.append((file_path, name))
+        if not packed:
+            return packed
+        for attempt in range(RETRIES + 1):
+            archive.seek(0)
+            encoder = MultipartEncoder(
+                fields={
+                    "location": json.dumps(location),
+                    "file": ("pack.tar", archive, "application/x-tar"),
+                }
+            )
+            resp = session.post(
+                url, data=encoder, headers={"Content-Type": encoder.content_type}
+            )
+            if resp.status_code not in RETRY_STATUS or attempt == RETRIES:
+                break
+            time.sleep(BACKOFF * 2**attempt)
+    resp.raise_for_status()
+    _post_stats["sent"] += 1
+    saved = resp.json()
+    return [file_path for file_path, name in packed if name in saved]
+
+
+def link_existing(data: dict, file_path: str, digest: str):
+    address = os.environ["API_ADDRESS"]
+    session = get_session()
+    resp = session.get(f"{address}/blobs/{digest}")
+    if not resp.ok or not resp.json()["exists"]:
+        return None
+    resp = session.post(
+        f"{address}/link",
+        data={
+            **data,
+            "file_name": json.dumps(os.path.basename(file_path)),
+            "hash": json.dumps(digest),
+        },
+    )
+    # The blob can be freed between the two requests
+    return resp.json() if resp.ok else None
+
+
+def _send(
+    method: str, data: dict, file_path: str | None = None, digest: str | None = None
+):
+    if method == "upload" and file_path is not None:
+        # Only callers that already hashed the file, such as backup, try the
+        # blob store first, unique renders and plates skip the extra read
+        result = None
+        if digest is not None:
+            result = link_existing(data, file_path, digest)
+        if result is None and os.path.getsize(file_path) >= CHUNKED_UPLOAD_SIZE:
+            result = upload_chunked(data, file_path)
+        if result is not None:
+            _post_stats["sent"] += 1
+            return result
+    url = f"{os.environ['API_ADDRESS']}/{method}"
+    session = get_session()
+    # Connection failures are retried by the adapter, gateway errors are retried
+    # here so file bodies can be reopened for every attempt
+    for attempt in range(RETRIES + 1):
+        if file_path is None:
+            resp = session.post(url, data=data)
+        else:
+            norm_path = os.path.normpath(file_path)
+            extra = {"source_path": json.dumps(list(Path(file_path).parts))}
+            fields = {**data, **extra}
+            with open(norm_path, "rb") as f:
+                fields["file"] = (
+                    os.path.basename(file_path),
+                    f,
+                    "application/octet-stream",
+                )
+                encoder = MultipartEncoder(fields=fields)
+                headers = {"Content-Type": encoder.content_type}
+                resp = session.post(url, data=encoder, headers=headers)
+        if resp.status_code not in RETRY_STATUS or attempt == RETRIES:
+            break
+        time.sleep(BACKOFF * 2**attempt)
+    _post_stats["sent"] += 1
+    return resp.json()
+
+
+def _record(key: str, value: float) -> None:
+    _post_stats[key] += value
+    _post_stats[f"max_{key}"] = max(_post_stats[f"max_{key}"], value)
+
+
+def _sender(queue: Queue) -> None:
+    while True:
+        queued_at, method, data, file_path, digest = queue.get()
+        start = time.perf_counter()
+        _record("queue_wait", start - queued_at)
+        try:
+            _send(method, data, file_path, digest)
+        except Exception as e:
+            _post_stats["failed"] += 1
+            logger.warning(f"Failed to post to {method}: {e}")
+        finally:
+            _record("send_time", time.perf_counter() - start)
+            queue.task_done()
+
+
+def _get_queue() -> Queue:
+    global _queue
+    with _session_lock:
+        if _queue is None:
+            _queue = Queue(QUEUE_SIZE)
+            threading.Thread(
+                target=_sender, args=(_queue,), name="HOP post", daemon=True
+            ).start()
+    return _queue
+
+
+def flush(timeout: float | None = None) -> bool:
+    if _queue is None:
+        return True
+    deadline = None if timeout is None else time.monotonic() + timeout
+    with _queue.all_tasks_done:
+        while _queue.unfinished_tasks:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return False
+            _queue.all_tasks_done.wait(remaining)
+    return True
+
+
+def post_stats() -> dict:
+    return {
+        **_post_stats,
+        "pending": _queue.unfinished_tasks if _queue is not None else 0,
+    }
+
+
+def post(
+    method: str,
+    data: dict,
+    file_path: str | None = None,
+    background: bool = False,
+    digest: str | None = None,
+):
+    data = {key: json.dumps(value) for key, value in data.items()}
+    if background:
+        try:
+            _get_queue().put_nowait((
+                time.perf_counter(),
+                method,
+                data,
+                file_path,
+                digest,
+            ))
+            _post_stats["queued"] += 1
+            return None
+        except Full:
+            logger.warning("Post queue is full, sending synchronously")
+    start = time.perf_counter()
+    try:
+        return _send(method, data, file_path, digest)
+    finally:
+        _record("send_time", time.perf_counter() - start)
+
+
+atexit.register(flush, 30)
+
+
+_clients: dict[str, MongoClient] = {}
+_collections: dict[tuple[str, str, str], Collection] = {}
+_client_lock = threading.Lock()
+_client_pid = os.getpid()
+_client_stats = {"opened": 0, "reused": 0}
+
+
+def _reset_clients() -> None:
+    global _client_lock, _client_pid, _session, _session_lock, _queue
+    # Sockets inherited across a fork are shared with the parent and threads are
+    # not inherited at all, so children start with fresh clients and queues
+    _clients.clear()
+    _collections.clear()
+    _client_lock = threading.Lock()
+    _client_pid = os.getpid()
+    _session, _session_lock, _queue = None, threading.Lock(), None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_clients)
+
+
+def get_client(address: str | None = None) -> MongoClient:
+    address = address or os.environ["MONGO_ADDRESS"]
+    if _client_pid != os.getpid():
+        _reset_clients()
+    with _client_lock:
+        client = _clients.get(address)
+        if client is None:
+            client = MongoClient(address, connect=False)
+            _clients[address] = client
+            _client_stats["opened"] += 1
+        else:
+            _client_stats["reused"] += 1
+    return client
+
+
 def get_collection(database_name: str, collection_name: str) -> Collection:
-    client = MongoClient(os.environ["MONGO_ADDRESS"])
-    if database_name in client.list_database_names():
-        db = client.get_database(database_name)
+    address = os.environ["MONGO_ADDRESS"]
+    if _client_pid != os.getpid():
+        _reset_clients()
+    key = (address, database_name, collection_name)
+    collection = _collections.get(key)
+    if collection is None:
+        collection = get_client(address)[database_name][collection_name]
+        _collections[key] = collection
     else:
-        db = client[database_name]
-    if collection_name in db.list_collection_names():
-        collection = db.get_collection(collection_name)
-    else:
-        collection = db[collection_name]
+        _client_stats["reused"] += 1
     return collection
 
 
+def client_stats() -> dict:
+    return {**_client_stats, "clients": len(_clients)}
+
+
+def close_clients() -> None:
+    with _client_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
+        _collections.clear()
+
+
 def find_shot(collection: Collection, start: int, end: int) -> dict:
-    return list(
-        collection.aggregate([
-            {
-                "$addFields": {
-                    "start_diff": {"$abs": {"$subtract": ["$start_frame", start]}},
-                    "end_diff": {"$abs": {"$subtract": ["$end_frame", end]}},
-                    "range_diff": {
-                        "$abs": {
-                            "$subtract": [
-                                {
-                                    "$subtract": [
-                                        "$end_frame",
-                                        "$start_frame",
-                                    ]
-                                },
-                                {"$subtract": [end, start]},
-                            ]
-                        }
-                    },
-                    "proximity_score": {
-                        "$add": [
-                            {"$abs": {"$subtract": ["$start_frame", start]}},
-                            {"$abs": {"$subtract": ["$end_frame", end]}},
-                        ]
-                    },
-                }
-            },
-            {"$sort": {"proximity_score": 1, "range_diff": 1}},
-            {"$limit": 1},
-        ])
-    )[0]
+    shot = find_nearest(collection, start, end)
+    if shot is None:
+        raise IndexError("No shots to match against")
+    return shot
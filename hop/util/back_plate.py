@@ -0,0 +1,132 @@
+import json
+import os
+from functools import cache
+from hop.util.lazy import lazy_import
+
+np = lazy_import("numpy")
+oiio = lazy_import("OpenImageIO")
+ocio = lazy_import("PyOpenColorIO")
+
+WIDTH, HEIGHT = 1280, 720
+SIDECAR = ".back_plate.json"
+# Bumped whenever the conversion changes, so older back plates are redone
+VERSION = 1
+
+
+@cache
+def cpu_processor(config: str | None, cam: str, view: str):
+    # Cached per worker process, so the config is only parsed and the
+    # processor only built once per colorspace instead of once per frame
+    return ocio.GetCurrentConfig().getProcessor(cam, view).getDefaultCPUProcessor()
+
+
+def fingerprint(exr_path: str, cam: str, view: str) -> str:
+    stat = os.stat(exr_path)
+    return json.dumps([
+        VERSION,
+        stat.st_size,
+        stat.st_mtime_ns,
+        os.environ.get("OCIO"),
+        cam,
+        view,
+        WIDTH,
+        HEIGHT,
+    ])
+
+
+def read_sidecar(folder: str) -> dict:
+    try:
+        with open(os.path.join(folder, SIDECAR)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_sidecar(folder: str, fingerprints: dict) -> None:
+    path = os.path.join(folder, SIDECAR)
+    with open(f"{path}.part", "w") as f:
+        json.dump(fingerprints, f, indent=1)
+    os.replace(f"{path}.part", path)
+
+
+def plan(exrs: list, folder: str, cam: str, view: str, first: int = 1001) -> tuple:
+    # Frames whose source, colorspace and output size match the sidecar keep
+    # their existing PNG
+    stored = read_sidecar(folder)
+    tasks, fingerprints = [], {}
+    for count, exr in enumerate(exrs):
+        name = f"bp.{(first + count):04d}.png"
+        output = os.path.join(folder, name)
+        fingerprints[name] = fingerprint(exr, cam, view)
+        if stored.get(name) == fingerprints[name] and os.path.exists(output):
+            continue
+        tasks.append((exr, output, cam, view))
+    return tasks, fingerprints
+
+
+def read_rgb(exr_path: str):
+    img = oiio.ImageInput.open(exr_path)
+    if not img:
+        raise RuntimeError(f"Could not open input image: {oiio.geterror()}")
+    try:
+        # The smallest mip level still covering the output saves reading and
+        # filtering full resolution pixels
+        level = 0
+        while img.seek_subimage(0, level + 1):
+            spec = img.spec()
+            if spec.width < WIDTH or spec.height < HEIGHT:
+                break
+            level += 1
+        img.seek_subimage(0, level)
+        spec = img.spec()
+        names = list(spec.channelnames)
+        if names[:3] == ["R", "G", "B"]:
+            pixels = img.read_image(0, level, 0, 3, "float")
+        else:
+            pixels = img.read_image(0, level, 0, spec.nchannels, "float")
+            # Single channel plates are repeated into grey RGB
+            channels = [
+                names.index(name) for name in ("R", "G", "B") if name in names
+            ] or [0]
+            pixels = pixels[..., (channels * 3)[:3]]
+    finally:
+        img.close()
+    if pixels is None:
+        raise RuntimeError(f"Could not read {exr_path}: {oiio.geterror()}")
+    return spec, pixels.reshape(spec.height, spec.width, -1)
+
+
+def convert_frame(exr_path: str, output_path: str, cam: str, view: str) -> bool:
+    spec, pixels = read_rgb(exr_path)
+
+    # Resizing before the color transform leaves a fraction of the pixels to
+    # process and filters in the plate's linear space
+    buf = oiio.ImageBuf(oiio.ImageSpec(spec.width, spec.height, 3, "float"))
+    buf.set_pixels(oiio.ROI(0, spec.width, 0, spec.height, 0, 1, 0, 3), pixels)
+    resized_buf = oiio.ImageBuf()
+    oiio.ImageBufAlgo.resize(resized_buf, buf, roi=oiio.ROI(0, WIDTH, 0, HEIGHT))
+    resized_pixels = np.ascontiguousarray(resized_buf.get_pixels(oiio.FLOAT))
+    cpu_processor(os.environ.get("OCIO"), cam, view).applyRGB(resized_pixels)
+    uint8_pixels = np.clip(resized_pixels * 255, 0, 255).astype(np.uint8)
+
+    output_spec = oiio.ImageSpec(WIDTH, HEIGHT, 3, "uint8")
+    output_spec.channelnames = ["R", "G", "B"]
+    output_spec.attribute("Compression", "none")
+    # Written beside the target and swapped in, so an interrupted run never
+    # leaves a truncated PNG behind. The hidden name without a .png suffix
+    # keeps it out of the bp.*.png glob that counts frames, so the writer is
+    # picked by format name
+    folder, name = os.path.split(output_path)
+    temp_path = os.path.join(folder, f".{name}.part")
+    out = oiio.ImageOutput.create("png")
+    if not out:
+        raise RuntimeError(f"Could not create output: {oiio.geterror()}")
+    if not out.open(temp_path, output_spec):
+        raise RuntimeError(f"Could not open output: {out.geterror()}")
+    success = out.write_image(uint8_pixels)
+    out.close()
+    if not success:
+        os.unlink(temp_path)
+        return False
+    os.replace(temp_path, output_path)
+    return True
@@ -1,19 +1,199 @@
 from argparse import ArgumentParser
 from hop.util import get_collection
 import os
+import re
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from queue import Queue
 from pathlib import Path
+from stat import S_ISREG
 from datetime import datetime
-from hop.util.api_helpers import post
+from hop.util.api_helpers import post, upload_pack
+from hop.util.hashing import file_hash, sample_hash
+from hop.util.walker import IgnoreRules, walk
+from hop.util.watcher import Debouncer, watcher
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
 import logging
 
+BATCH_SIZE = 1000
+PROGRESS_INTERVAL = 10
+SAMPLE_THRESHOLD = 256 * 1024 * 1024
+PACK_SIZE = 1024 * 1024
+PACK_FILES = 1000
+PACK_BYTES = 64 * 1024 * 1024
 
-def backup(
-    start_folder: str,
-    ignore_folders: list = [],
-    ignore_folder_names: list = [],
-    ignore_file_types: list = [],
-    verbose: bool = False,
-):
+
+def check_content(path: str, size: int, known: dict | None) -> tuple:
+    sample = None
+    if size >= SAMPLE_THRESHOLD:
+        sample = sample_hash(path, size)
+        if known is None or known.get("sample") != sample:
+            return None, sample
+    return file_hash(path), sample
+
+
+class BackupRun:
+    def __init__(
+        self, start_folder: str, logger: logging.Logger, hash_files: bool = False
+    ):
+        self.start_folder = start_folder
+        self.logger = logger
+        self.hash_files = hash_files
+        self.collection = get_collection("backups", "files")
+        self.known = {}
+        self.operations = []
+        self.lock = threading.Lock()
+        self.start_time = time.perf_counter()
+        self.db_time = 0.0
+        self.walked, self.uploaded, self.failed, self.bytes = 0, 0, 0, 0
+        self.unchanged, self.unrecorded = 0, 0
+
+    def load_state(self) -> None:
+        db_start = time.perf_counter()
+        self.collection.create_index("path")
+        self.known = {
+            doc.pop("path"): doc
+            for doc in self.collection.find(
+                {"path": {"$regex": f"^{re.escape(str(Path(self.start_folder)))}"}},
+                {"_id": 0, "path": 1, "time": 1, "size": 1, "hash": 1, "sample": 1},
+            )
+        }
+        self.db_time += time.perf_counter() - db_start
+        self.logger.debug(f"Loaded {len(self.known)} known files")
+
+    def location(self, path: str) -> list:
+        file_parts = list(Path(path.replace(self.start_folder, "")).parts)
+        if file_parts[0] == os.sep:
+            file_parts.pop(0)
+        file_parts.insert(0, "backup")
+        return file_parts
+
+    def _write(self, operations: list) -> None:
+        db_start = time.perf_counter()
+        try:
+            self.collection.bulk_write(operations, ordered=False)
+        except Exception as e:
+            # The files themselves are uploaded, they are only checked again on
+            # the next run
+            unrecorded = len(operations)
+            if isinstance(e, BulkWriteError):
+                unrecorded = len(e.details.get("writeErrors", [])) or unrecorded
+            self.logger.error(f"Failed to record {unrecorded} files: {e}")
+            with self.lock:
+                self.unrecorded += unrecorded
+        with self.lock:
+            self.db_time += time.perf_counter() - db_start
+
+    def record(self, operation: UpdateOne) -> None:
+        with self.lock:
+            self.operations.append(operation)
+            if len(self.operations) < BATCH_SIZE:
+                return
+            operations, self.operations = self.operations, []
+        self._write(operations)
+
+    def write_state(self) -> None:
+        with self.lock:
+            operations, self.operations = self.operations, []
+        if operations:
+            self._write(operations)
+
+    def state(
+        self,
+        path: str,
+        file_time: float,
+        size: int,
+        digest: str | None = None,
+        sample: str | None = None,
+    ) -> UpdateOne:
+        fields = {"time": file_time, "size": size, "location": self.location(path)}
+        if not self.hash_files:
+            update = {"$set": fields, "$unset": {"hash": "", "sample": ""}}
+        else:
+            update = {"$set": {**fields, "hash": digest, "sample": sample}}
+        self.known[path] = {**fields, "hash": digest, "sample": sample}
+        return UpdateOne({"path": path}, update, upsert=True)
+
+    def content_changed(
+        self, item: tuple, digest: str | None, sample: str | None
+    ) -> bool:
+        known = self.known.get(item[0])
+        if digest is None or known is None or known.get("hash") != digest:
+            return True
+        self.logger.debug(f"Skipping {item[0]}: Content unchanged")
+        with self.lock:
+            self.unchanged += 1
+        self.record(self.state(*item, digest, sample))
+        return False
+
+    def upload(
+        self,
+        path: str,
+        file_time: float,
+        size: int,
+        digest: str | None = None,
+        sample: str | None = None,
+    ) -> None:
+        # The server replaces an existing file atomically, so changed files
+        # no longer need a separate delete first
+        location = self.location(path)
+        self.logger.info(f"Uploading {path}")
+        try:
+            if self.hash_files and digest is None:
+                digest = file_hash(path)
+            post(
+                "upload",
+                {"location": location[:-1], "uuid": False},
+                path,
+                digest=digest,
+            )
+        except Exception as e:
+            self.logger.error(f"Failed to upload {path}: {e}")
+            with self.lock:
+                self.failed += 1
+            return
+        with self.lock:
+            self.uploaded += 1
+            self.bytes += size
+        self.record(self.state(path, file_time, size, digest, sample))
+
+    def upload_pack(self, items: list) -> None:
+        self.logger.info(f"Uploading {len(items)} packed files")
+        names = {item[0]: "/".join(self.location(item[0])[1:]) for item in items}
+        try:
+            packed = set(upload_pack(["backup"], list(names.items())))
+        except Exception as e:
+            self.logger.error(f"Failed to upload pack of {len(items)} files: {e}")
+            with self.lock:
+                self.failed += len(items)
+            return
+        with self.lock:
+            self.uploaded += len(packed)
+            self.failed += len(items) - len(packed)
+            self.bytes += sum(item[2] for item in items if item[0] in packed)
+        for item in items:
+            if item[0] in packed:
+                self.record(self.state(*item))
+
+    def progress(self) -> str:
+        elapsed = time.perf_counter() - self.start_time or 1e-9
+        return (
+            f"Checked {self.walked} files, uploaded {self.uploaded} "
+            f"({self.unchanged} unchanged) "
+            f"({self.bytes / 1024**2:.1f} MB), {self.failed} failed, "
+            f"{self.unrecorded} not recorded in {elapsed:.1f}s "
+            f"({self.walked / elapsed:.1f} files/s, "
+            f"{self.uploaded / elapsed:.1f} uploads/s, "
+            f"{self.bytes / 1024**2 / elapsed:.2f} MB/s, DB time {self.db_time:.2f}s)"
+        )
+
+
+def get_logger(verbose: bool = False) -> logging.Logger:
     logger = logging.getLogger("HOP Backup")
     if not logger.handlers:
         logger.setLevel(logging.DEBUG if verbose else logging.INFO)
@@ -21,59 +201,243 @@ def backup(
         console_handler.setFormatter(logging.Formatter("%(levelname)s - %(message)s"))
         logger.addHandler(console_handler)
     logging.getLogger().setLevel(logging.WARNING)
+    return logger
 
-    collection = get_collection("backups", "files")
-    ignore_paths = [Path(start_folder) / ignore for ignore in ignore_folders]
-    for walk in os.walk(start_folder):
-        folder = walk[0]
-        folder_parts = [part.lower() for part in Path(folder).parts]
 
-        if any(
-            skip_string.lower() in folder_parts for skip_string in ignore_folder_names
-        ):
-            logger.debug(f"Skipping {folder}: Ignored folder name")
-            continue
-        for file in walk[2]:
-            path = Path(folder) / file
-            if any(
-                path == ignore or path.is_relative_to(ignore) for ignore in ignore_paths
-            ):
-                logger.debug(f"Skipping {str(path)}: Ignored path")
-                continue
-            if any(file.lower().endswith(ext.lower()) for ext in ignore_file_types):
-                logger.debug(f"Skipping {str(path)}: Ignored file type")
+def ignore_rules(
+    start_folder: str,
+    ignore_folders: list = [],
+    ignore_folder_names: list = [],
+    ignore_file_types: list = [],
+    ignore_globs: list = [],
+) -> IgnoreRules:
+    return IgnoreRules(
+        [
+            os.path.relpath(os.path.join(start_folder, folder), start_folder)
+            for folder in ignore_folders
+        ],
+        ignore_folder_names,
+        ignore_file_types,
+        ignore_globs,
+    )
+
+
+def changed(run: BackupRun, path: str, stat: os.stat_result) -> tuple | None:
+    run.walked += 1
+    file_time = datetime.fromtimestamp(stat.st_mtime).timestamp()
+    known = run.known.get(path)
+    if known is not None and known["time"] >= file_time:
+        run.logger.debug(f"Skipping {path}: No change")
+        return None
+    return path, file_time, stat.st_size
+
+
+def changed_files(run: BackupRun, rules: IgnoreRules):
+    for _, files in walk(str(Path(run.start_folder)), rules, logger=run.logger):
+        for entry in files:
+            try:
+                stat = entry.stat()
+            except OSError as e:
+                run.logger.error(f"Failed to read {entry.path}: {e}")
+                with run.lock:
+                    run.failed += 1
                 continue
-            file_time = datetime.fromtimestamp(os.stat(str(path)).st_mtime).timestamp()
-            doc = collection.find_one({"path": str(path)})
-            upload_file = True
-            delete = False
-            if doc is not None:
-                if doc["time"] < file_time:
-                    delete = True
-                else:
-                    logger.debug(f"Skipping {str(path)}: No change")
-                    upload_file = False
-
-            if upload_file:
-                file_parts = list(Path(str(path).replace(start_folder, "")).parts)
-                if file_parts[0] == os.sep:
-                    file_parts.pop(0)
-                file_parts.insert(0, "backup")
-                if delete:
-                    logger.info(f"Deleting {str(path)}")
-                    post("delete", {"location": file_parts})
-                logger.info(f"Uploading {str(path)}")
-                post("upload", {"location": file_parts[:-1], "uuid": False}, str(path))
-
-                if doc is None:
-                    collection.insert_one({
-                        "path": str(path),
-                        "time": file_time,
-                    })
-                else:
-                    collection.update_one(
-                        {"path": str(path)}, {"$set": {"time": file_time}}
+            if item := changed(run, entry.path, stat):
+                yield item
+
+
+def changed_paths(run: BackupRun, paths: list):
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        except OSError as e:
+            run.logger.error(f"Failed to read {path}: {e}")
+            with run.lock:
+                run.failed += 1
+            continue
+        if S_ISREG(stat.st_mode) and (item := changed(run, path, stat)):
+            yield item
+
+
+def process(
+    run: BackupRun,
+    items,
+    jobs: int = 1,
+    hash_jobs: int | None = None,
+    pack_size: int = 0,
+):
+    logger = run.logger
+    work = Queue(jobs * 4)
+    hash_jobs = hash_jobs or os.cpu_count() or 1
+    batch, batch_bytes = [], 0
+    errors = []
+
+    def dispatch(item):
+        # Files under pack_size are grouped so each pack is a single request
+        nonlocal batch, batch_bytes
+        if item[2] >= pack_size:
+            work.put(item)
+            return
+        batch.append(item)
+        batch_bytes += item[2]
+        if len(batch) >= PACK_FILES or batch_bytes >= PACK_BYTES:
+            work.put(batch)
+            batch, batch_bytes = [], 0
+
+    def walker():
+        # Content checks run in worker processes while the walk continues, and
+        # are resolved in order once enough of them are in flight
+        pending = deque()
+
+        def resolve():
+            item, future = pending.popleft()
+            try:
+                digest, sample = future.result()
+            except OSError as e:
+                logger.error(f"Failed to hash {item[0]}: {e}")
+                with run.lock:
+                    run.failed += 1
+                return
+            if run.content_changed(item, digest, sample):
+                dispatch((*item, digest, sample))
+
+        try:
+            with (
+                ProcessPoolExecutor(hash_jobs) if run.hash_files else nullcontext()
+            ) as pool:
+                for item in items:
+                    if pool is None:
+                        dispatch(item)
+                        continue
+                    future = pool.submit(
+                        check_content, item[0], item[2], run.known.get(item[0])
                     )
+                    pending.append((item, future))
+                    if len(pending) >= hash_jobs * 4:
+                        resolve()
+                while pending:
+                    resolve()
+            if batch:
+                work.put(batch)
+        except BaseException as e:
+            # Anything past a single file, such as a broken hashing pool, ends
+            # the walk and is raised again once the uploads are drained
+            errors.append(e)
+        finally:
+            for _ in range(jobs):
+                work.put(None)
+
+    def uploader():
+        # Every item is taken off the queue even after a failure, so the
+        # walker never blocks on a full queue
+        while (item := work.get()) is not None:
+            try:
+                if isinstance(item, list):
+                    run.upload_pack(item)
+                else:
+                    run.upload(*item)
+            except Exception as e:
+                count = len(item) if isinstance(item, list) else 1
+                logger.error(f"Failed to upload {count} files: {e}")
+                with run.lock:
+                    run.failed += count
+
+    threads = [threading.Thread(target=walker, name="HOP backup walker")] + [
+        threading.Thread(target=uploader, name=f"HOP backup upload {count}")
+        for count in range(jobs)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        while thread.is_alive():
+            thread.join(PROGRESS_INTERVAL)
+            if thread.is_alive():
+                logger.info(run.progress())
+    run.write_state()
+    if errors:
+        raise errors[0]
+
+
+def backup(
+    start_folder: str,
+    ignore_folders: list = [],
+    ignore_folder_names: list = [],
+    ignore_file_types: list = [],
+    ignore_globs: list = [],
+    verbose: bool = False,
+    jobs: int = 1,
+    hash_files: bool = False,
+    hash_jobs: int | None = None,
+    pack_size: int = 0,
+):
+    logger = get_logger(verbose)
+    rules = ignore_rules(
+        start_folder,
+        ignore_folders,
+        ignore_folder_names,
+        ignore_file_types,
+        ignore_globs,
+    )
+    run = BackupRun(start_folder, logger, hash_files)
+    run.load_state()
+    process(run, changed_files(run, rules), jobs, hash_jobs, pack_size)
+    logger.info(run.progress())
+    return run
+
+
+def watch(
+    start_folder: str,
+    ignore_folders: list = [],
+    ignore_folder_names: list = [],
+    ignore_file_types: list = [],
+    ignore_globs: list = [],
+    verbose: bool = False,
+    jobs: int = 1,
+    hash_files: bool = False,
+    hash_jobs: int | None = None,
+    pack_size: int = 0,
+    debounce: float = 2,
+    reconcile: float = 6 * 3600,
+    poll_interval: float = 60,
+):
+    logger = get_logger(verbose)
+    rules = ignore_rules(
+        start_folder,
+        ignore_folders,
+        ignore_folder_names,
+        ignore_file_types,
+        ignore_globs,
+    )
+    run = BackupRun(start_folder, logger, hash_files)
+    run.load_state()
+    root = str(Path(start_folder))
+    source = watcher(root, rules, poll_interval, logger)
+    debouncer = Debouncer(debounce)
+    # The first reconciliation catches anything changed while not watching
+    last_reconcile = -reconcile
+    logger.info(f"Watching {root} with {type(source).__name__}")
+    try:
+        while True:
+            debouncer.add(source.read(min(debounce, 1)))
+            if paths := debouncer.ready():
+                logger.debug(f"Checking {len(paths)} changed paths")
+                process(run, changed_paths(run, paths), jobs, hash_jobs, pack_size)
+                logger.info(run.progress())
+            if source.overflowed or time.monotonic() - last_reconcile >= reconcile:
+                logger.info(f"Reconciling {root}")
+                source.overflowed = False
+                run.load_state()
+                process(run, changed_files(run, rules), jobs, hash_jobs, pack_size)
+                logger.info(run.progress())
+                last_reconcile = time.monotonic()
+    except KeyboardInterrupt:
+        logger.info("Stopping watch")
+    finally:
+        source.close()
+        run.write_state()
+    return run
 
 
 if __name__ == "__main__":
@@ -99,16 +463,88 @@ if __name__ == "__main__":
         default=[],
         help="List of file extensions to ignore (e.g., '.tmp', '.log').",
     )
+    parser.add_argument(
+        "--ignore-globs",
+        nargs="*",
+        default=[],
+        help="List of glob patterns to ignore (e.g., '*.bak', 'cache/*').",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of files to upload in parallel (default: 1)",
+    )
+    parser.add_argument(
+        "--hash",
+        action="store_true",
+        help="Compare file contents so files that were only touched are skipped",
+    )
+    parser.add_argument(
+        "--hash-jobs",
+        type=int,
+        default=None,
+        help="Number of hashing processes (default: number of CPUs)",
+    )
+    parser.add_argument(
+        "--pack",
+        action="store_true",
+        help="Upload small files together as tar packs",
+    )
+    parser.add_argument(
+        "--pack-size",
+        type=int,
+        default=PACK_SIZE,
+        help=f"Largest file in bytes to pack (default: {PACK_SIZE})",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Keep running and back up files as they change",
+    )
+    parser.add_argument(
+        "--debounce",
+        type=float,
+        default=2,
+        help="Seconds a changed file must be quiet before upload (default: 2)",
+    )
+    parser.add_argument(
+        "--reconcile",
+        type=float,
+        default=6,
+        help="Hours between full scans while watching (default: 6)",
+    )
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=60,
+        help="Seconds between scans when inotify is unavailable (default: 60)",
+    )
     parser.add_argument(
         "--verbose",
         action="store_true",
         help="Enable verbose output (prints debug information)",
     )
     args = parser.parse_args()
-    backup(
+    options = dict(
         start_folder=args.start_folder,
         ignore_folders=args.ignore_folders,
         ignore_folder_names=args.ignore_folder_names,
         ignore_file_types=args.ignore_file_types,
+        ignore_globs=args.ignore_globs,
         verbose=args.verbose,
+        jobs=args.jobs,
+        hash_files=args.hash,
+        hash_jobs=args.hash_jobs,
+        pack_size=args.pack_size if args.pack else 0,
     )
+    if args.watch:
+        run = watch(
+            **options,
+            debounce=args.debounce,
+            reconcile=args.reconcile * 3600,
+            poll_interval=args.poll_interval,
+        )
+    else:
+        run = backup(**options)
+    sys.exit(1 if run.failed or run.unrecorded else 0)
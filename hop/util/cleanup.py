@@ -1,11 +1,75 @@
 from argparse import ArgumentParser
 import logging
 import os
-from pathlib import Path
+import re
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from hop.util.walker import walk
 
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4}
 
-def cleanup(start_folder: str, hours: float, verbose: bool = False):
+
+def parse_size(size: str) -> int:
+    match = re.fullmatch(r"\s*([\d.]+)\s*([KMGT]?)i?B?\s*", size, re.IGNORECASE)
+    if match is None:
+        raise ValueError(f"Invalid size {size}")
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2).upper()])
+
+
+def format_size(size: float) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
+def open_files(start_folder: str) -> set:
+    # Files held open by running jobs are found through /proc, which is simply
+    # empty on platforms without it
+    root = os.path.abspath(start_folder)
+    found = set()
+    try:
+        pids = [pid for pid in os.listdir("/proc") if pid.isdigit()]
+    except OSError:
+        return found
+    for pid in pids:
+        try:
+            descriptors = os.scandir(f"/proc/{pid}/fd")
+        except OSError:
+            continue
+        with descriptors:
+            for descriptor in descriptors:
+                try:
+                    target = os.readlink(descriptor.path)
+                except OSError:
+                    continue
+                if target.startswith(root):
+                    found.add(target)
+    return found
+
+
+def remove(path: str, logger: logging.Logger) -> int:
+    try:
+        size = os.stat(path).st_size
+        os.unlink(path)
+    except FileNotFoundError:
+        return 0
+    except OSError as e:
+        logger.warning(f"Unable to remove {path}: {e}")
+        return 0
+    return size
+
+
+def cleanup(
+    start_folder: str,
+    hours: float,
+    verbose: bool = False,
+    quota: int | None = None,
+    protect_minutes: float = 30,
+    jobs: int = 8,
+    dry_run: bool = False,
+):
     logger = logging.getLogger("HOP Cleanup")
     if not logger.handlers:
         logger.setLevel(logging.DEBUG if verbose else logging.INFO)
@@ -15,20 +79,77 @@ def cleanup(start_folder: str, hours: float, verbose: bool = False):
 
     current_time = datetime.now().timestamp()
     cutoff_time = current_time - (hours * 3600)
+    protect_time = current_time - (protect_minutes * 60)
     logger.debug(f"Current time: {datetime.fromtimestamp(current_time)}")
     logger.debug(f"Cutoff time: {datetime.fromtimestamp(cutoff_time)}")
 
-    for root, _, files in os.walk(start_folder, topdown=False):
-        for file in files:
-            file_path = Path(root) / file
-            logger.debug(f"Checking: {str(file_path)}")
-            file_mtime = file_path.stat().st_mtime
-            if file_mtime < cutoff_time:
-                logger.info(f"Removing {file_path}: Older than cutoff")
-                file_path.unlink()
-        if not os.listdir(root) and root != start_folder:
-            logger.info(f"Removing {root}: Empty Folder")
+    # One bottom-up pass collects every file with its size and last use, and
+    # the folder order needed to prune empties afterwards
+    folders, files, total = [], [], 0
+    for root, entries in walk(start_folder, topdown=False, logger=logger):
+        folders.append(root)
+        for entry in entries:
+            stat = entry.stat()
+            top = os.path.relpath(entry.path, start_folder).split(os.sep)[0]
+            if top == entry.name:
+                top = "."
+            used = max(stat.st_atime, stat.st_mtime)
+            files.append((used, stat.st_mtime, stat.st_size, entry.path, top))
+            total += stat.st_size
+    in_use = open_files(start_folder)
+    logger.debug(f"Found {len(files)} files ({format_size(total)})")
+
+    remaining = total
+    evict = []
+    for used, mtime, size, path, top in sorted(files):
+        if os.path.abspath(path) in in_use:
+            logger.debug(f"Keeping {path}: Open by a running process")
+            continue
+        if mtime < cutoff_time:
+            reason = "Older than cutoff"
+        elif quota is not None and remaining > quota and used < protect_time:
+            reason = "Over quota"
+        else:
+            continue
+        evict.append((path, size, top, reason))
+        remaining -= size
+    if quota is not None and remaining > quota:
+        logger.warning(
+            f"{format_size(remaining)} still in use after cleanup, over the "
+            f"{format_size(quota)} quota because the rest is protected"
+        )
+
+    report = {}
+    for _, size, top, _ in evict:
+        count, reclaimed = report.get(top, (0, 0))
+        report[top] = (count + 1, reclaimed + size)
+    for top, (count, reclaimed) in sorted(
+        report.items(), key=lambda item: item[1][1], reverse=True
+    ):
+        logger.info(f"{top}: {count} files, {format_size(reclaimed)} reclaimable")
+    logger.info(
+        f"{'Would reclaim' if dry_run else 'Reclaiming'} "
+        f"{format_size(total - remaining)} of {format_size(total)}"
+    )
+    if dry_run:
+        return report
+
+    for path, _, _, reason in evict:
+        logger.info(f"Removing {path}: {reason}")
+    with ThreadPoolExecutor(jobs) as executor:
+        reclaimed = sum(
+            executor.map(lambda item: remove(item[0], logger), evict, chunksize=64)
+        )
+    for root in folders:
+        if root == start_folder:
+            continue
+        try:
             os.rmdir(root)
+        except OSError:
+            continue
+        logger.info(f"Removing {root}: Empty Folder")
+    logger.info(f"Removed {len(evict)} files, reclaimed {format_size(reclaimed)}")
+    return report
 
 
 if __name__ == "__main__":
@@ -42,6 +163,26 @@ if __name__ == "__main__":
     parser.add_argument(
         "--time", type=float, default=24, help="Age threshold in hours (default: 24)"
     )
+    parser.add_argument(
+        "--quota",
+        type=parse_size,
+        default=None,
+        help="Evict least recently used files until the folder fits, e.g. 50G",
+    )
+    parser.add_argument(
+        "--protect",
+        type=float,
+        default=30,
+        help="Minutes a used file is protected from quota eviction (default: 30)",
+    )
+    parser.add_argument(
+        "--jobs", type=int, default=8, help="Parallel deletes (default: 8)"
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Report reclaimable space per folder without deleting",
+    )
     parser.add_argument("--verbose", action="store_true", help="Enable verbose logging")
     args = parser.parse_args()
 
@@ -50,5 +191,12 @@ if __name__ == "__main__":
             "start_folder must be provided or set HOP_TEMP environment variable"
         )
 
-    cleanup(args.start_folder, args.time, args.verbose)
-
+    cleanup(
+        args.start_folder,
+        args.time,
+        args.verbose,
+        quota=args.quota,
+        protect_minutes=args.protect,
+        jobs=args.jobs,
+        dry_run=args.dry_run,
+    )
@@ -1,44 +1,230 @@
-import OpenEXR as exr
 import os
-from pathlib import Path
+import shutil
+import struct
+import tempfile
 from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from fractions import Fraction
+from hop.util.lazy import lazy_import
+from hop.util.walker import walk
 
-def change_fps(start_folder: str, fps: int | None = None):
+exr = lazy_import("OpenEXR")
+
+MAGIC = b"\x76\x2f\x31\x01"
+TILED_FLAG = 0x200
+NON_IMAGE_FLAG = 0x800
+MULTIPART_FLAG = 0x1000
+COPY_SIZE = 16 * 1024 * 1024
+# Scanlines stored per chunk for each compression, used to count the chunks of
+# single part files that have no chunkCount attribute
+LINES_PER_CHUNK = {
+    0: 1,
+    1: 1,
+    2: 1,
+    3: 16,
+    4: 32,
+    5: 16,
+    6: 32,
+    7: 32,
+    8: 32,
+    9: 256,
+    10: 256,
+    11: 32,
+}
+
+
+def is_exr(path: str) -> bool:
+    try:
+        with open(path, "rb") as f:
+            return f.read(4) == MAGIC
+    except OSError:
+        return False
+
+
+def _read_name(f) -> bytes:
+    name = bytearray()
+    while (byte := f.read(1)) != b"\0":
+        if not byte:
+            raise ValueError("Truncated header")
+        name += byte
+    return bytes(name)
+
+
+def read_header(f) -> list:
+    attributes = []
+    while name := _read_name(f):
+        type_name = _read_name(f)
+        (size,) = struct.unpack("<i", f.read(4))
+        value = f.read(size)
+        if len(value) != size:
+            raise ValueError("Truncated header")
+        attributes.append([name, type_name, value])
+    return attributes
+
+
+def write_header(attributes: list) -> bytes:
+    return (
+        b"".join(
+            name + b"\0" + type_name + b"\0" + struct.pack("<i", len(value)) + value
+            for name, type_name, value in attributes
+        )
+        + b"\0"
+    )
+
+
+def chunk_count(attributes: list, version: int) -> int:
+    values = {name: value for name, _, value in attributes}
+    if b"chunkCount" in values:
+        return struct.unpack("<i", values[b"chunkCount"])[0]
+    if version & (TILED_FLAG | NON_IMAGE_FLAG):
+        raise ValueError("Tiled or deep file without chunkCount")
+    lines = LINES_PER_CHUNK.get(values[b"compression"][0])
+    if lines is None:
+        raise ValueError(f"Unknown compression {values[b'compression'][0]}")
+    _, y_min, _, y_max = struct.unpack("<4i", values[b"dataWindow"])
+    return -(-(y_max - y_min + 1) // lines)
+
+
+def set_fps(attributes: list, fps: Fraction) -> bool:
+    value = struct.pack("<iI", fps.numerator, fps.denominator)
+    for attribute in attributes:
+        if attribute[0] != b"framesPerSecond":
+            continue
+        numerator, denominator = struct.unpack("<iI", attribute[2])
+        if denominator and Fraction(numerator, denominator) == fps:
+            return False
+        attribute[1:] = [b"rational", value]
+        return True
+    attributes.append([b"framesPerSecond", b"rational", value])
+    return True
+
+
+def temp_output(output: str) -> str:
+    directory = os.path.dirname(output) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(
+        dir=directory, prefix=f".{os.path.basename(output)}.", suffix=".part"
+    )
+    os.close(fd)
+    return temp_path
+
+
+def patch_fps(path: str, fps: int, output: str) -> bool:
+    # Only the header grows or shrinks, so the compressed chunks are copied
+    # untouched and every offset moves by the same amount
+    with open(path, "rb") as f:
+        if f.read(4) != MAGIC:
+            raise ValueError("Not an OpenEXR file")
+        version_bytes = f.read(4)
+        (version,) = struct.unpack("<i", version_bytes)
+        multipart = bool(version & MULTIPART_FLAG)
+        headers = []
+        while header := read_header(f):
+            headers.append(header)
+            if not multipart:
+                break
+        header_end = f.tell()
+        changed = [set_fps(header, Fraction(fps)) for header in headers]
+        if not any(changed):
+            return False
+        total = sum(chunk_count(header, version) for header in headers)
+
+        new_header = b"".join([
+            MAGIC,
+            version_bytes,
+            *(write_header(header) for header in headers),
+            b"\0" if multipart else b"",
+        ])
+        delta = len(new_header) - header_end
+        table = f.read(8 * total)
+        if len(table) != 8 * total:
+            raise ValueError("Truncated offset table")
+        offsets = [
+            offset + delta if offset else 0
+            for offset in struct.unpack(f"<{total}Q", table)
+        ]
+
+        temp_path = temp_output(output)
+        try:
+            with open(temp_path, "wb") as out:
+                out.write(new_header)
+                out.write(struct.pack(f"<{total}Q", *offsets))
+                shutil.copyfileobj(f, out, COPY_SIZE)
+            shutil.copymode(path, temp_path)
+            os.replace(temp_path, output)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+    return True
+
+
+def decode_fps(path: str, fps: int, output: str) -> bool:
+    with exr.File(path, separate_channels=True) as buffer:
+        parts, changed = [], False
+        for part in buffer.parts:
+            header = dict(part.header)
+            if header.get("framesPerSecond") != fps:
+                header["framesPerSecond"] = Fraction(fps)
+                changed = True
+            channels = {name: ch.pixels.copy() for name, ch in part.channels.items()}
+            parts.append(exr.Part(header, channels))
+    if not changed:
+        return False
+
+    temp_path = temp_output(output)
+    try:
+        if len(parts) == 1:
+            with exr.File(parts[0].header, parts[0].channels) as outfile:
+                outfile.write(temp_path)
+        else:
+            with exr.File(parts) as outfile:
+                outfile.write(temp_path)
+        os.replace(temp_path, output)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+    return True
+
+
+def convert_file(path: str, fps: int, in_place: bool = False) -> str | None:
+    folder, file = os.path.split(path)
+    output = path if in_place else os.path.join(folder, f"{fps}_FPS", file)
+    try:
+        written = patch_fps(path, fps, output)
+    except (ValueError, struct.error) as e:
+        print(f"Decoding {path}: {e}")
+        written = decode_fps(path, fps, output)
+    return output if written else None
+
+
+def change_fps(
+    start_folder: str,
+    fps: int | None = None,
+    in_place: bool = False,
+    jobs: int | None = None,
+):
     fps = fps if type(fps) is int else int(os.environ["FPS"])
+    paths = [
+        entry.path
+        for _, files in walk(start_folder)
+        for entry in files
+        if is_exr(entry.path)
+    ]
 
-    for walk in os.walk(start_folder):
-        folder = Path(walk[0])
-        files = walk[2]
-        for file in files:
-            path = folder / file
-            if not exr.isOpenExrFile(str(path)):
+    with ProcessPoolExecutor(jobs) as executor:
+        futures = {
+            executor.submit(convert_file, path, fps, in_place): path for path in paths
+        }
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                output = future.result()
+            except Exception as e:
+                print(f"Failed {path}: {e}")
                 continue
-            print(f"Checking: {path}")
-            with exr.File(str(path), separate_channels=True) as buffer:
-                parts = []
-                for part in buffer.parts:
-                    header = dict(part.header)
-                    if "framesPerSecond" in header.keys() and header["framesPerSecond"] == fps:
-                        continue
-                    header["framesPerSecond"] = Fraction(fps)
-                    channels = {
-                        name: ch.pixels.copy() for name, ch in part.channels.items()
-                    }
-
-                    parts.append(exr.Part(header, channels))
-
-                if len(parts) > 0:
-                    dir = Path(folder) / f"{fps}_FPS"
-                    os.makedirs(str(dir), exist_ok=True)
-                    output = str(dir / file)
-                    if len(parts) == 1:
-                        with exr.File(parts[0].header, parts[0].channels) as outfile:
-                            outfile.write(output)
-                    else:
-                        with exr.File(parts) as outfile:
-                            outfile.write(output)
-                    print(f"{path} -> {output}")
+            if output is not None:
+                print(f"{path} -> {output}")
 
 
 if __name__ == "__main__":
@@ -48,9 +234,20 @@ if __name__ == "__main__":
     )
     parser.add_argument(
         "--fps",
-        nargs=1,
-        default=os.environ["FPS"],
+        type=int,
+        default=None,
         help="The desired FPS to convert to, default uses the 'FPS' environment variable",
     )
+    parser.add_argument(
+        "--in-place",
+        action="store_true",
+        help="Replace the original files instead of writing to a '{fps}_FPS' folder",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=None,
+        help="Number of files to convert in parallel (default: number of CPUs)",
+    )
     args = parser.parse_args()
-    change_fps(args.start_folder, args.fps)
+    change_fps(args.start_folder, args.fps, args.in_place, args.jobs)
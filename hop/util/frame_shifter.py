@@ -1,26 +1,182 @@
+import json
 import os
-from glob import glob
-from pathlib import Path
+import re
 from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+from hop.util.walker import walk
 
+JOURNAL = ".frame_shift.journal"
 
-def shift(start_folder: str, pattern: str, start: int):
-    for walk in os.walk(start_folder):
-        folder = Path(walk[0])
-        files = sorted(glob(str(folder / pattern)))
-        if files:
-            temp_names = [
-                folder / f"tmp_{pattern.replace('*', str(i))}" for i in range(len(files))
-            ]
 
-            for temp_name, back_plate in zip(temp_names, files):
-                print(f"Temp Renaming: {back_plate} -> {temp_name}")
-                os.rename(back_plate, temp_name)
+def frame_name(pattern: str, frame: int, padding: int | None = None) -> str:
+    number = str(frame) if padding is None else f"{frame:0{padding}d}"
+    return pattern.replace("*", number)
 
-            for count, temp_name in enumerate(temp_names):
-                new_name = folder / pattern.replace("*", str(start + count))
-                print(f"Renaming: {temp_name} -> {new_name}")
-                os.rename(temp_name, new_name)
+
+def sequence(names: list, pattern: str) -> list:
+    if pattern.count("*") != 1:
+        raise ValueError(f"Pattern {pattern} needs exactly one '*' for the frame")
+    prefix, suffix = pattern.split("*")
+    matcher = re.compile(f"{re.escape(prefix)}(-?\\d+){re.escape(suffix)}")
+    frames = [
+        (int(match.group(1)), name)
+        for name in names
+        if (match := matcher.fullmatch(name))
+    ]
+    return sorted(frames)
+
+
+def order_renames(mapping: dict) -> list:
+    # A rename can run once its target is no longer an unmoved source, which
+    # orders every chain by shift direction and leaves only true cycles
+    # needing a temporary name
+    pending = dict(mapping)
+    waiting = {target: source for source, target in pending.items()}
+    ready = [source for source, target in pending.items() if target not in pending]
+    steps = []
+    count = 0
+    while pending:
+        while ready:
+            source = ready.pop()
+            steps.append((source, pending.pop(source)))
+            if (blocked := waiting.pop(source, None)) is not None:
+                ready.append(blocked)
+        if pending:
+            source = next(iter(pending))
+            temp = f".frame_shift_tmp_{count}_{source}"
+            count += 1
+            steps.append((source, temp))
+            target = pending.pop(source)
+            pending[temp] = target
+            waiting[target] = temp
+            ready.append(waiting.pop(source))
+    return steps
+
+
+def plan_folder(
+    folder: str, names: list, pattern: str, start: int, padding: int | None = None
+) -> list:
+    frames = sequence(names, pattern)
+    mapping = {
+        name: frame_name(pattern, start + count, padding)
+        for count, (_, name) in enumerate(frames)
+    }
+    mapping = {source: target for source, target in mapping.items() if source != target}
+    existing = set(names) - set(mapping)
+    if clashes := sorted(set(mapping.values()) & existing):
+        raise FileExistsError(f"{folder} already has {', '.join(clashes[:5])}")
+    return order_renames(mapping)
+
+
+def read_journal(folder: str) -> tuple[list, int]:
+    with open(os.path.join(folder, JOURNAL)) as f:
+        plan = [tuple(step) for step in json.loads(f.readline())]
+        done = sum(1 for line in f if line.strip())
+    return plan, done
+
+
+def run_plan(folder: str, plan: list, done: int = 0) -> int:
+    journal = os.path.join(folder, JOURNAL)
+    if not done:
+        with open(journal, "w") as f:
+            f.write(json.dumps(plan) + "\n")
+    with open(journal, "a") as f:
+        for index, (source, target) in enumerate(plan[done:], done):
+            source_path = os.path.join(folder, source)
+            target_path = os.path.join(folder, target)
+            # A crash between a rename and its journal entry leaves the rename
+            # already applied, which resume has to accept
+            if os.path.exists(source_path) or not os.path.exists(target_path):
+                os.rename(source_path, target_path)
+            f.write(f"{index}\n")
+            f.flush()
+    os.unlink(journal)
+    return len(plan) - done
+
+
+def rollback_folder(folder: str) -> int:
+    plan, done = read_journal(folder)
+    done = min(done + 1, len(plan))
+    undone = 0
+    for source, target in reversed(plan[:done]):
+        source_path = os.path.join(folder, source)
+        target_path = os.path.join(folder, target)
+        if os.path.exists(target_path) and not os.path.exists(source_path):
+            os.rename(target_path, source_path)
+            undone += 1
+    os.unlink(os.path.join(folder, JOURNAL))
+    return undone
+
+
+def shift_folder(
+    folder: str,
+    names: list,
+    pattern: str,
+    start: int,
+    padding: int | None = None,
+    dry_run: bool = False,
+    resume: bool = False,
+    rollback: bool = False,
+) -> str | None:
+    if JOURNAL in names:
+        if rollback:
+            return f"Rolled back {rollback_folder(folder)} renames in {folder}"
+        if resume:
+            plan, done = read_journal(folder)
+            return f"Finished {run_plan(folder, plan, done)} renames in {folder}"
+        raise RuntimeError(f"{folder} has an interrupted shift, use resume or rollback")
+    if resume or rollback:
+        return None
+
+    plan = plan_folder(folder, names, pattern, start, padding)
+    if not plan:
+        return None
+    temps = sum(target.startswith(".frame_shift_tmp_") for _, target in plan)
+    if dry_run:
+        for source, target in plan:
+            print(f"Renaming: {os.path.join(folder, source)} -> {target}")
+        return f"Would rename {len(plan)} files in {folder} ({temps} temporary)"
+    run_plan(folder, plan)
+    return f"Renamed {len(plan)} files in {folder} ({temps} temporary)"
+
+
+def shift(
+    start_folder: str,
+    pattern: str,
+    start: int,
+    padding: int | None = None,
+    dry_run: bool = False,
+    jobs: int = 8,
+    resume: bool = False,
+    rollback: bool = False,
+):
+    folders = [
+        (folder, [entry.name for entry in files])
+        for folder, files in walk(start_folder)
+    ]
+    with ThreadPoolExecutor(jobs) as executor:
+        futures = [
+            executor.submit(
+                shift_folder,
+                folder,
+                names,
+                pattern,
+                start,
+                padding,
+                dry_run,
+                resume,
+                rollback,
+            )
+            for folder, names in folders
+        ]
+        for future in futures:
+            try:
+                message = future.result()
+            except (OSError, RuntimeError, ValueError) as e:
+                print(f"Failed: {e}")
+                continue
+            if message:
+                print(message)
 
 
 if __name__ == "__main__":
@@ -37,8 +193,33 @@ if __name__ == "__main__":
         type=int,
         help="the new start number of the sequence",
     )
+    parser.add_argument(
+        "--padding",
+        type=int,
+        default=None,
+        help="zero pad new frame numbers to this width (default: no padding)",
+    )
+    parser.add_argument(
+        "--jobs", type=int, default=8, help="folders to rename in parallel"
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true", help="print the rename plan only"
+    )
+    parser.add_argument(
+        "--resume", action="store_true", help="finish interrupted shifts"
+    )
+    parser.add_argument(
+        "--rollback", action="store_true", help="undo interrupted shifts"
+    )
 
     args = parser.parse_args()
-    shift(args.start_folder, args.pattern, args.start)
-
-
+    shift(
+        args.start_folder,
+        args.pattern,
+        args.start,
+        args.padding,
+        args.dry_run,
+        args.jobs,
+        args.resume,
+        args.rollback,
+    )
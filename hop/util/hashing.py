@@ -0,0 +1,37 @@
+import hashlib
+import os
+
+BLOCK_SIZE = 1024 * 1024
+SAMPLE_SIZE = 64 * 1024
+SAMPLE_COUNT = 16
+
+
+def new_hash():
+    return hashlib.blake2b(digest_size=32)
+
+
+def file_hash(path: str, block_size: int = BLOCK_SIZE) -> str:
+    hasher = new_hash()
+    with open(path, "rb") as f:
+        while block := f.read(block_size):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def sample_hash(
+    path: str,
+    size: int | None = None,
+    sample_size: int = SAMPLE_SIZE,
+    samples: int = SAMPLE_COUNT,
+) -> str:
+    # Evenly spaced blocks plus the size catch most edits to huge files
+    # without reading all of them
+    size = os.path.getsize(path) if size is None else size
+    hasher = new_hash()
+    hasher.update(size.to_bytes(8, "little"))
+    span = max(size - sample_size, 0)
+    with open(path, "rb") as f:
+        for count in range(samples):
+            f.seek(span * count // max(samples - 1, 1))
+            hasher.update(f.read(sample_size))
+    return hasher.hexdigest()
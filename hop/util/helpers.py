@@ -5,23 +5,20 @@ import sys
 from importlib import reload
 from pathlib import Path
 from shutil import copy2, move
-import numpy as np
 import subprocess
+from hop.util.ingest import ingest_file
+from hop.util.lazy import lazy_import
+
+np = lazy_import("numpy")
 
 
 def copy_file(path: str, target: list) -> None | str:
     target[-1] = f"{target[-1]}{Path(path).suffix}"
     root = os.environ["HOP"]
     if path is not None and root is not None:
-        save_dir = os.path.join(root, *target[:-1])
-        save_path = os.path.join(save_dir, target[-1])
-        try:
-            os.remove(save_path)
-        except FileNotFoundError:
-            pass
-        os.makedirs(save_dir, exist_ok=True)
-        new_location = copy2(path, save_path)
-        return new_location.replace(root, "$HOP")
+        save_path = os.path.join(root, *target)
+        ingest_file(path, save_path)
+        return save_path.replace(root, "$HOP")
 
 
 def move_folder(path: str, target: list) -> None | str:
@@ -0,0 +1,268 @@
+from argparse import ArgumentParser
+import errno
+import logging
+import os
+import secrets
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable
+from hop.util.hashing import BLOCK_SIZE, SAMPLE_COUNT, SAMPLE_SIZE
+from hop.util.walker import walk
+
+try:
+    import fcntl
+except ModuleNotFoundError:
+    fcntl = None
+
+COPY_BLOCK = 16 * 1024 * 1024
+# linux/fs.h FICLONE, shares the extents of the source on btrfs, XFS and other
+# copy-on-write filesystems
+FICLONE = 0x40049409
+# Coarsest mtime some network and FAT filesystems keep
+MTIME_TOLERANCE = 2_000_000_000
+PROGRESS_INTERVAL = 10
+VERIFY_MODES = ("none", "sample", "full")
+# Errors meaning a fast path is unavailable here, not that the copy failed
+UNSUPPORTED = {
+    errno.EXDEV,
+    errno.EPERM,
+    errno.EMLINK,
+    errno.EINVAL,
+    errno.ENOSYS,
+    errno.ENOTTY,
+    errno.EOPNOTSUPP,
+    errno.ENOTSUP,
+    errno.EBADF,
+}
+
+
+def matches(source: str, stat: os.stat_result, target: str, verify: str) -> bool:
+    try:
+        target_stat = os.stat(target)
+    except FileNotFoundError:
+        return False
+    if os.path.samestat(stat, target_stat):
+        return True
+    if target_stat.st_size != stat.st_size:
+        return False
+    if abs(target_stat.st_mtime_ns - stat.st_mtime_ns) > MTIME_TOLERANCE:
+        return False
+    if verify == "none":
+        return True
+    return same_content(source, target, stat.st_size, verify == "sample")
+
+
+def same_content(source: str, target: str, size: int, sample: bool) -> bool:
+    # Both files are local, so comparing the bytes directly is cheaper than
+    # hashing them and stops at the first difference
+    with open(source, "rb") as a, open(target, "rb") as b:
+        if not sample or size <= SAMPLE_SIZE * SAMPLE_COUNT:
+            while block := a.read(BLOCK_SIZE):
+                if block != b.read(len(block)):
+                    return False
+            return True
+        # The same evenly spaced blocks as hashing.sample_hash
+        span = size - SAMPLE_SIZE
+        for count in range(SAMPLE_COUNT):
+            offset = span * count // (SAMPLE_COUNT - 1)
+            a.seek(offset)
+            b.seek(offset)
+            if a.read(SAMPLE_SIZE) != b.read(SAMPLE_SIZE):
+                return False
+    return True
+
+
+def _reflink(source_fd: int, target_fd: int) -> bool:
+    if fcntl is None:
+        return False
+    try:
+        fcntl.ioctl(target_fd, FICLONE, source_fd)
+    except OSError as e:
+        if e.errno in UNSUPPORTED:
+            return False
+        raise
+    return True
+
+
+def _copy_range(source_fd: int, target_fd: int, size: int) -> bool:
+    # The kernel copies without passing the data through user space, and can
+    # share blocks on filesystems that support it
+    if not hasattr(os, "copy_file_range"):
+        return False
+    copied = 0
+    while copied < size:
+        try:
+            count = os.copy_file_range(
+                source_fd, target_fd, min(size - copied, COPY_BLOCK)
+            )
+        except OSError as e:
+            if copied == 0 and e.errno in UNSUPPORTED:
+                return False
+            raise
+        if count == 0:
+            break
+        copied += count
+    return True
+
+
+def copy_data(source: str, temp_path: str, size: int) -> str:
+    with open(source, "rb") as src, open(temp_path, "wb") as dst:
+        if _reflink(src.fileno(), dst.fileno()):
+            return "reflink"
+        if _copy_range(src.fileno(), dst.fileno(), size):
+            return "copy_file_range"
+        shutil.copyfileobj(src, dst, COPY_BLOCK)
+    return "copy"
+
+
+def ingest_file(
+    source: str, target: str, link: bool = False, verify: str = "sample"
+) -> tuple[str, int]:
+    stat = os.stat(source)
+    if matches(source, stat, target, verify):
+        return "skipped", 0
+    folder, name = os.path.split(target)
+    os.makedirs(folder or ".", exist_ok=True)
+    # Writing next to the target and replacing it means readers never see a
+    # half copied file and a failed copy leaves the old one in place
+    temp_path = os.path.join(folder, f".{name}.{secrets.token_hex(4)}.part")
+    try:
+        if link:
+            try:
+                os.link(source, temp_path)
+                os.replace(temp_path, target)
+                return "hardlink", 0
+            except OSError as e:
+                if e.errno not in UNSUPPORTED:
+                    raise
+        method = copy_data(source, temp_path, stat.st_size)
+        shutil.copystat(source, temp_path)
+        os.replace(temp_path, target)
+    except BaseException:
+        if os.path.lexists(temp_path):
+            os.unlink(temp_path)
+        raise
+    return method, stat.st_size
+
+
+class IngestRun:
+    def __init__(self, logger: logging.Logger, total: int):
+        self.logger = logger
+        self.total = total
+        self.lock = threading.Lock()
+        self.start_time = time.perf_counter()
+        self.methods = {}
+        self.done, self.failed, self.bytes = 0, 0, 0
+
+    def record(self, method: str, size: int) -> None:
+        with self.lock:
+            self.done += 1
+            self.methods[method] = self.methods.get(method, 0) + 1
+            self.bytes += size
+
+    def progress(self) -> str:
+        elapsed = time.perf_counter() - self.start_time or 1e-9
+        methods = ", ".join(
+            f"{count} {method}" for method, count in sorted(self.methods.items())
+        )
+        return (
+            f"Ingested {self.done} of {self.total} files ({methods or 'none'}), "
+            f"{self.failed} failed, {self.bytes / 1024**2:.1f} MB in "
+            f"{elapsed:.1f}s ({self.bytes / 1024**2 / elapsed:.2f} MB/s)"
+        )
+
+
+def folder_pairs(source: str, target: str) -> list:
+    if os.path.isfile(source):
+        return [(source, target)]
+    return [
+        (entry.path, os.path.join(target, os.path.relpath(entry.path, source)))
+        for _, files in walk(source)
+        for entry in files
+    ]
+
+
+def ingest(
+    pairs: list,
+    jobs: int = 8,
+    link: bool = False,
+    verify: str = "sample",
+    progress: Callable[[int, int], Any] | None = None,
+    verbose: bool = False,
+) -> IngestRun:
+    logger = logging.getLogger("HOP Ingest")
+    if not logger.handlers:
+        logger.setLevel(logging.DEBUG if verbose else logging.INFO)
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(logging.Formatter("%(levelname)s - %(message)s"))
+        logger.addHandler(console_handler)
+
+    run = IngestRun(logger, len(pairs))
+    last_report = time.monotonic()
+    executor = ThreadPoolExecutor(jobs)
+    try:
+        futures = {
+            executor.submit(ingest_file, source, target, link, verify): target
+            for source, target in pairs
+        }
+        for future in as_completed(futures):
+            try:
+                method, size = future.result()
+                run.record(method, size)
+                logger.debug(f"{method.capitalize()} {futures[future]}")
+            except OSError as e:
+                logger.error(f"Failed to ingest {futures[future]}: {e}")
+                run.failed += 1
+            if progress is not None:
+                progress(run.done + run.failed, run.total)
+            if time.monotonic() - last_report >= PROGRESS_INTERVAL:
+                logger.info(run.progress())
+                last_report = time.monotonic()
+    finally:
+        # An interrupted caller, such as a cancelled progress dialog, only
+        # waits for the copies already running
+        executor.shutdown(cancel_futures=True)
+    logger.info(run.progress())
+    return run
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(
+        description="Copy a file or folder, skipping files already in place."
+    )
+    parser.add_argument("source", help="File or folder to ingest")
+    parser.add_argument("target", help="Destination file or folder")
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=8,
+        help="Number of files to copy in parallel (default: 8)",
+    )
+    parser.add_argument(
+        "--link",
+        action="store_true",
+        help="Hardlink files on the same filesystem instead of copying them. "
+        "Later edits to the source then show up in the target",
+    )
+    parser.add_argument(
+        "--verify",
+        choices=VERIFY_MODES,
+        default="sample",
+        help="How files with matching size and mtime are compared before "
+        "skipping them (default: sample)",
+    )
+    parser.add_argument(
+        "--verbose",
+        action="store_true",
+        help="Enable verbose output (prints debug information)",
+    )
+    args = parser.parse_args()
+    ingest(
+        folder_pairs(args.source, args.target),
+        jobs=args.jobs,
+        link=args.link,
+        verify=args.verify,
+        verbose=args.verbose,
+    )
@@ -0,0 +1,52 @@
+import importlib
+import threading
+from typing import Any, Callable
+from hop.util.api_helpers import get_collection
+
+
+class Lazy:
+    __slots__ = ("_factory", "_target", "_lock")
+
+    def __init__(self, factory: Callable[[], Any]):
+        object.__setattr__(self, "_factory", factory)
+        object.__setattr__(self, "_target", None)
+        object.__setattr__(self, "_lock", threading.Lock())
+
+    def resolve(self) -> Any:
+        target = object.__getattribute__(self, "_target")
+        if target is None:
+            with object.__getattribute__(self, "_lock"):
+                target = object.__getattribute__(self, "_target")
+                if target is None:
+                    target = object.__getattribute__(self, "_factory")()
+                    object.__setattr__(self, "_target", target)
+        return target
+
+    @property
+    def resolved(self) -> bool:
+        return object.__getattribute__(self, "_target") is not None
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.resolve(), name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        setattr(self.resolve(), name, value)
+
+    def __getitem__(self, key: Any) -> Any:
+        return self.resolve()[key]
+
+    def __call__(self, *args, **kwargs) -> Any:
+        return self.resolve()(*args, **kwargs)
+
+    def __repr__(self) -> str:
+        if self.resolved:
+            return repr(self.resolve())
+        return f"<Lazy {object.__getattribute__(self, '_factory')!r}>"
+
+
+def lazy_import(name: str) -> Any:
+    return Lazy(lambda: importlib.import_module(name))
+
+
+def lazy_collection(database_name: str, collection_name: str) -> Any:
+    return Lazy(lambda: get_collection(database_name, collection_name))
@@ -0,0 +1,277 @@
+from argparse import ArgumentParser
+import json
+import logging
+import os
+import secrets
+import shutil
+import socket
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from bson import ObjectId
+from hop.util.api_helpers import get_collection
+from hop.util.ingest import ingest, matches
+
+
+def jobs_folder() -> str:
+    # Jobs live next to the data, so a move started on one machine can be
+    # resumed from any other
+    return os.path.join(os.environ["HOP"], ".moves")
+
+
+def same_device(source: str, target_folder: str) -> bool:
+    os.makedirs(target_folder, exist_ok=True)
+    return os.stat(source).st_dev == os.stat(target_folder).st_dev
+
+
+def get_logger(verbose: bool = False) -> logging.Logger:
+    logger = logging.getLogger("HOP Mover")
+    if not logger.handlers:
+        logger.setLevel(logging.DEBUG if verbose else logging.INFO)
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(logging.Formatter("%(levelname)s - %(message)s"))
+        logger.addHandler(console_handler)
+    return logger
+
+
+def set_status(document: dict | None, status: str | None, error: str = "") -> None:
+    if document is None:
+        return
+    collection = get_collection(document["database"], document["collection"])
+    if status is None:
+        update = {"$unset": {"status": "", "move_error": ""}}
+    else:
+        update = {"$set": {"status": status, "move_error": error}}
+    collection.update_one({"_id": ObjectId(document["_id"])}, update)
+
+
+def queue_move(
+    source: str,
+    target_folder: str,
+    document: dict | None = None,
+    interpreter: str | None = None,
+) -> str:
+    # The copy runs in a detached process, so it carries on after the
+    # session that retired the shot is closed
+    folder = jobs_folder()
+    os.makedirs(folder, exist_ok=True)
+    job_path = os.path.join(folder, f"{secrets.token_hex(8)}.json")
+    with open(job_path, "w") as f:
+        json.dump(
+            {
+                "source": source,
+                "target": os.path.join(target_folder, os.path.basename(source)),
+                "document": document,
+            },
+            f,
+        )
+    env = os.environ.copy()
+    env["PYTHONPATH"] = os.pathsep.join(sys.path)
+    with open(f"{job_path[:-5]}.log", "ab") as log:
+        subprocess.Popen(
+            (
+                interpreter or os.environ.get("PYTHON", sys.executable),
+                os.path.abspath(__file__),
+                "--job",
+                job_path,
+            ),
+            stdin=subprocess.DEVNULL,
+            stdout=log,
+            stderr=log,
+            env=env,
+            start_new_session=os.name != "nt",
+            creationflags=(
+                subprocess.CREATE_NO_WINDOW | subprocess.DETACHED_PROCESS
+                if os.name == "nt"
+                else 0
+            ),
+        )
+    return job_path
+
+
+def claim(job_path: str, force: bool = False) -> bool:
+    lock_path = f"{job_path[:-5]}.lock"
+    owner = f"{socket.gethostname()} {os.getpid()}"
+    try:
+        fd = os.open(lock_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL)
+    except FileExistsError:
+        with open(lock_path) as f:
+            host, _, pid = f.read().partition(" ")
+        # Only a lock left by a dead process on this machine can be taken over
+        stale = host == socket.gethostname() and not pid_alive(int(pid or 0))
+        if not (force or stale):
+            return False
+        with open(lock_path, "w") as f:
+            f.write(owner)
+        return True
+    with open(fd, "w") as f:
+        f.write(owner)
+    return True
+
+
+def pid_alive(pid: int) -> bool:
+    # os.kill terminates the process on Windows, so locks there are only
+    # taken over with force
+    if os.name == "nt":
+        return True
+    if pid <= 0:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        pass
+    return True
+
+
+def move_plan(source: str, target: str) -> tuple[list, list, list]:
+    # Everything rmtree would remove is listed, links and empty folders
+    # included, and anything that cannot be copied stops the move
+    if os.path.islink(source):
+        return [], [(source, target)], []
+    if not os.path.isdir(source):
+        return [(source, target)], [], []
+
+    def fail(error: OSError):
+        raise error
+
+    pairs, links, folders = [], [], []
+    for root, dirs, files in os.walk(source, onerror=fail):
+        target_root = os.path.normpath(
+            os.path.join(target, os.path.relpath(root, source))
+        )
+        folders.append(target_root)
+        for name in dirs:
+            path = os.path.join(root, name)
+            if os.path.islink(path):
+                links.append((path, os.path.join(target_root, name)))
+        for name in files:
+            path = os.path.join(root, name)
+            if os.path.islink(path):
+                links.append((path, os.path.join(target_root, name)))
+            elif os.path.isfile(path):
+                pairs.append((path, os.path.join(target_root, name)))
+            else:
+                raise OSError(f"Cannot move {path}: Not a regular file")
+    return sorted(pairs), sorted(links), sorted(folders)
+
+
+def copy_link(source: str, target: str) -> None:
+    link = os.readlink(source)
+    if os.path.islink(target) and os.readlink(target) == link:
+        return
+    if os.path.lexists(target):
+        os.unlink(target)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    os.symlink(link, target, target_is_directory=os.path.isdir(source))
+
+
+def verify_pairs(pairs: list, jobs: int) -> list:
+    def check(pair: tuple) -> str | None:
+        source, target = pair
+        if matches(source, os.stat(source), target, "full"):
+            return None
+        return target
+
+    with ThreadPoolExecutor(jobs) as executor:
+        return [target for target in executor.map(check, pairs) if target]
+
+
+def run_job(job_path: str, jobs: int = 8, logger: logging.Logger | None = None):
+    logger = logger or get_logger()
+    with open(job_path) as f:
+        job = json.load(f)
+    source, target, document = job["source"], job["target"], job["document"]
+    try:
+        # A run that stopped after deleting the source only has the status
+        # left to update
+        if os.path.lexists(source):
+            plan = move_plan(source, target)
+            pairs, links, folders = plan
+            logger.info(
+                f"Moving {len(pairs)} files and {len(links)} links from {source} "
+                f"to {target}"
+            )
+            for folder in folders:
+                os.makedirs(folder, exist_ok=True)
+            for link in links:
+                copy_link(*link)
+            run = ingest(pairs, jobs=jobs)
+            if run.failed:
+                raise OSError(f"{run.failed} files failed to copy")
+            mismatched = [folder for folder in folders if not os.path.isdir(folder)]
+            mismatched += [
+                link_target
+                for link_source, link_target in links
+                if not os.path.islink(link_target)
+                or os.readlink(link_target) != os.readlink(link_source)
+            ]
+            mismatched += verify_pairs(pairs, jobs)
+            if mismatched:
+                raise OSError(f"{len(mismatched)} paths differ, first {mismatched[0]}")
+            # Anything added to the source while copying would be lost
+            if move_plan(source, target) != plan:
+                raise OSError(f"{source} changed during the move")
+            if os.path.isdir(source) and not os.path.islink(source):
+                shutil.rmtree(source)
+            else:
+                os.unlink(source)
+        set_status(document, None)
+        logger.info(f"Moved {source} to {target}")
+    except Exception as e:
+        logger.error(f"Failed to move {source}: {e}")
+        set_status(document, "move_failed", str(e))
+        return False
+    finally:
+        try:
+            os.unlink(f"{job_path[:-5]}.lock")
+        except FileNotFoundError:
+            pass
+    for path in (job_path, f"{job_path[:-5]}.log"):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+    return True
+
+
+def resume(jobs: int = 8, force: bool = False, verbose: bool = False):
+    logger = get_logger(verbose)
+    folder = jobs_folder()
+    names = sorted(os.listdir(folder)) if os.path.isdir(folder) else []
+    for name in names:
+        if not name.endswith(".json"):
+            continue
+        job_path = os.path.join(folder, name)
+        if not claim(job_path, force):
+            logger.info(f"Skipping {name}: Claimed by a running mover")
+            continue
+        run_job(job_path, jobs, logger)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Finish queued background folder moves.")
+    parser.add_argument("--job", help="Run a single queued move")
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=8,
+        help="Number of files to copy in parallel (default: 8)",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Take over moves claimed by another machine",
+    )
+    parser.add_argument(
+        "--verbose",
+        action="store_true",
+        help="Enable verbose output (prints debug information)",
+    )
+    args = parser.parse_args()
+    if args.job:
+        if claim(args.job, args.force):
+            run_job(args.job, args.jobs, get_logger(args.verbose))
+    else:
+        resume(args.jobs, args.force, args.verbose)
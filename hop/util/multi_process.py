@@ -1,14 +1,38 @@
 import importlib
 import inspect
 import os
-import pickle
+import queue
+import shutil
+import signal
 import subprocess
 import sys
 import tempfile
-from concurrent.futures import ProcessPoolExecutor
-from typing import Any, Callable, Sequence, Union
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Iterator, Sequence, Union
 import json
 
+if __package__:
+    from hop.util.transport import TaskError, dumps, loads, read_frame
+else:
+    # Run as the worker script, which only has this folder on its path
+    from transport import Dispatcher, default_workers, loads, write_frame
+
+CANCEL_TIMEOUT = 5
+
+
+def _read_frames(channel, frames: queue.Queue) -> None:
+    try:
+        while (frame := read_frame(channel)) is not None:
+            frames.put(frame)
+    finally:
+        frames.put(None)
+
+
+def _read_stderr(stream, output: list) -> None:
+    output.append(stream.read())
+
 
 class MultiProcess:
     def __init__(
@@ -16,6 +40,10 @@ class MultiProcess:
         function: Callable,
         *args: Union[Any, Sequence[Any], Sequence[Sequence[Any]]],
         interpreter: str | None = None,
+        persistent: bool = False,
+        max_workers: int | None = None,
+        chunksize: int | None = None,
+        io_bound: bool = False,
     ):
         self.function = function
         self.original_input = args
@@ -23,8 +51,19 @@ class MultiProcess:
         self.interpreter = interpreter or sys.executable
         self.module_path = self.get_module()
         self.function_name = function.__name__
+        self.persistent = persistent
+        # A chunksize of None sizes batches from the measured time per task
+        self.options = {
+            "max_workers": max_workers,
+            "chunksize": chunksize,
+            "io_bound": io_bound,
+        }
         self.process = None
-        self.tempfile_path = None
+        self.connection = None
+        self.spill_dir = None
+        self.frames = None
+        self.stderr = []
+        self.readers = []
 
     def get_module(self) -> str:
         module = inspect.getmodule(self.function)
@@ -90,19 +129,40 @@ class MultiProcess:
             )
         return json.loads(result.stdout)
 
+    def get_run_env(self) -> dict:
+        env = os.environ.copy()
+        env["PYTHONPATH"] = os.pathsep.join(sys.path)
+        return env
+
     def execute(self) -> "MultiProcess":
+        # Large arguments and results are passed through mapped files in here
+        self.spill_dir = tempfile.mkdtemp(prefix="hop_multi_process_")
+        if self.persistent:
+            # Imported here so the cold worker script stays standard library only
+            from hop.util import worker_service
+
+            self.connection = worker_service.connect(
+                self.interpreter, self.get_run_env()
+            )
+            self.connection.send((
+                self.module_path,
+                self.function_name,
+                dumps(self.args, self.spill_dir),
+                self.spill_dir,
+                self.options,
+            ))
+            return self
+
         script_file = str(__file__)
         if not script_file.endswith(".py"):
             script_file += ".py"
 
-        env = os.environ.copy()
-        env["PYTHONPATH"] = os.pathsep.join(sys.path)
+        env = self.get_run_env()
 
         # Write arguments to a temporary file
-        temp_file = tempfile.NamedTemporaryFile(delete=False)
-        self.tempfile_path = temp_file.name
-        with temp_file:
-            pickle.dump(self.args, temp_file)
+        args_path = os.path.join(self.spill_dir, "args")
+        with open(args_path, "wb") as f:
+            f.write(dumps(self.args, self.spill_dir))
 
         # Pass the temp file path instead of serialized arguments
         self.process = subprocess.Popen(
@@ -111,49 +171,168 @@ class MultiProcess:
                 script_file,
                 self.module_path,
                 self.function_name,
-                self.tempfile_path,
+                args_path,
+                self.spill_dir,
+                json.dumps(self.options),
             ),
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             env=env,
-            creationflags=subprocess.CREATE_NO_WINDOW if os.name == "nt" else 0,
+            # A process group of its own lets cancel() take the pool down too
+            start_new_session=os.name != "nt",
+            creationflags=(
+                subprocess.CREATE_NO_WINDOW | subprocess.CREATE_NEW_PROCESS_GROUP
+                if os.name == "nt"
+                else 0
+            ),
         )
+        self.frames = queue.Queue()
+        self.readers = [
+            threading.Thread(
+                target=_read_frames,
+                args=(self.process.stdout, self.frames),
+                daemon=True,
+            ),
+            threading.Thread(
+                target=_read_stderr,
+                args=(self.process.stderr, self.stderr),
+                daemon=True,
+            ),
+        ]
+        for reader in self.readers:
+            reader.start()
         return self
 
-    def retrieve(self, timeout: float | None = None) -> Any:
-        if self.process:
+    def format_results(self, flat_results: dict) -> Any:
+        if len(self.original_input) == 1 and isinstance(
+            self.original_input[0], (list, tuple)
+        ):
+            return [flat_results[idx] for idx in range(len(flat_results))]
+        return flat_results
+
+    def next_frame(self, timeout: float | None) -> tuple:
+        if self.connection:
+            if not self.connection.poll(timeout):
+                raise TimeoutError("Worker service timed out.")
+            try:
+                return self.connection.recv()
+            except (EOFError, OSError):
+                raise RuntimeError("Worker service closed the connection.")
+        try:
+            frame = self.frames.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError("Subprocess timed out.")
+        if frame is None:
+            self.process.wait()
+            for reader in self.readers:
+                reader.join()
+            stderr = b"".join(self.stderr).decode(errors="replace").strip()
+            raise RuntimeError(
+                f"Subprocess exited with code {self.process.returncode}: {stderr}"
+            )
+        return frame
+
+    def as_completed(self, timeout: float | None = None) -> Iterator[tuple[int, Any]]:
+        if not self.connection and not self.process:
+            raise RuntimeError("Subprocess has not been started.")
+        deadline = None if timeout is None else time.monotonic() + timeout
+        finished = False
+        try:
+            while True:
+                remaining = (
+                    None if deadline is None else max(deadline - time.monotonic(), 0)
+                )
+                kind, _, payload = self.next_frame(remaining)
+                if kind == "DONE":
+                    finished = True
+                    return
+                if kind == "ERROR":
+                    finished = True
+                    raise RuntimeError(payload)
+                for kind, idx, result in payload:
+                    if kind == "FAILED":
+                        yield idx, TaskError(**result)
+                    else:
+                        yield idx, loads(result)
+        finally:
+            # Leaving early, through a timeout, an error or the caller
+            # breaking out, stops whatever is still running
+            if not finished:
+                self.cancel()
+            self.close()
+
+    def retrieve(
+        self,
+        timeout: float | None = None,
+        progress: Callable[[int, int], Any] | None = None,
+    ) -> Any:
+        results = {}
+        tasks = self.as_completed(timeout)
+        try:
+            for idx, result in tasks:
+                results[idx] = result
+                if progress is not None:
+                    progress(len(results), len(self.args))
+        finally:
+            tasks.close()
+        return self.format_results(results)
+
+    def cancel(self) -> None:
+        if self.connection:
+            # Waiting for the service to confirm keeps a following request
+            # from sharing the pool with the tasks being killed
             try:
-                stdout = self.process.communicate(timeout=timeout)[0]
-            except subprocess.TimeoutExpired:
-                self.process.kill()
-                raise TimeoutError("Subprocess timed out.")
-            finally:
-                # Clean up the temporary file
-                if self.tempfile_path:
-                    os.unlink(self.tempfile_path)
-                    self.tempfile_path = None
-
-            output = stdout.decode()
-            if "ERROR" in output:
-                raise RuntimeError(output.split("ERROR", 1)[1].strip())
-            if "RESULTS" in output:
-                result_data = output.split("RESULTS", 1)[1].strip()
-                flat_results = pickle.loads(bytes.fromhex(result_data))
-                if len(self.original_input) == 1 and isinstance(
-                    self.original_input[0], (list, tuple)
-                ):
-                    return [flat_results[idx] for idx in range(len(flat_results))]
-                return flat_results
-            raise ValueError("No results found in subprocess output.")
-        raise RuntimeError("Subprocess has not been started.")
+                self.connection.send(("CANCEL",))
+                while self.connection.poll(CANCEL_TIMEOUT):
+                    if self.connection.recv()[0] in ("CANCELLED", "DONE", "ERROR"):
+                        break
+            except (OSError, EOFError):
+                pass
+            self.connection.close()
+            self.connection = None
+        if self.process and self.process.poll() is None:
+            if os.name == "nt":
+                subprocess.run(
+                    ("taskkill", "/F", "/T", "/PID", str(self.process.pid)),
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL,
+                    creationflags=subprocess.CREATE_NO_WINDOW,
+                )
+            else:
+                try:
+                    os.killpg(self.process.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+            self.process.wait()
+
+    def close(self) -> None:
+        if self.connection:
+            self.connection.close()
+            self.connection = None
+        if self.process:
+            self.process.wait()
+            self.process = None
+        # Mapped results stay valid once their spill files are gone
+        if self.spill_dir:
+            shutil.rmtree(self.spill_dir, ignore_errors=True)
+            self.spill_dir = None
 
 
 if __name__ == "__main__":
-    if len(sys.argv) != 4:
-        print("ERROR: Incorrect arguments passed to subprocess")
+    # Results go out as frames on the original stdout, anything the tasks
+    # print is sent to stderr so it cannot corrupt the channel
+    channel = os.fdopen(os.dup(1), "wb")
+    os.dup2(2, 1)
+    sys.stdout = sys.stderr
+
+    if len(sys.argv) != 6:
+        write_frame(
+            channel, ("ERROR", None, "Incorrect arguments passed to subprocess")
+        )
         sys.exit(1)
 
-    module_path, function_name, temp_file_path = sys.argv[1:]
+    module_path, function_name, args_path, spill_dir, options = sys.argv[1:]
+    options = json.loads(options)
     module_dir, module_file = os.path.split(module_path)
     module_name = os.path.splitext(module_file)[0]
 
@@ -162,38 +341,58 @@ if __name__ == "__main__":
     try:
         module = importlib.import_module(module_name)
     except ImportError as e:
-        print(f"ERROR: Failed to import module {module_name}: {e}")
+        write_frame(
+            channel, ("ERROR", None, f"Failed to import module {module_name}: {e}")
+        )
         sys.exit(1)
 
     # Get the function
     try:
         function = getattr(module, function_name)
     except AttributeError:
-        print(f"ERROR: Function {function_name} not found in module {module_name}")
+        write_frame(
+            channel,
+            (
+                "ERROR",
+                None,
+                f"Function {function_name} not found in module {module_name}",
+            ),
+        )
         sys.exit(1)
 
     # Load arguments from the temporary file
     try:
-        with open(temp_file_path, "rb") as temp_file:
-            args = pickle.load(temp_file)
+        with open(args_path, "rb") as f:
+            args = loads(f.read())
     except Exception as e:
-        print(f"ERROR: Failed to load arguments from temporary file: {e}")
+        write_frame(
+            channel,
+            ("ERROR", None, f"Failed to load arguments from temporary file: {e}"),
+        )
         sys.exit(1)
 
-    # Execute function in parallel
-    with ProcessPoolExecutor() as executor:
-        futures = {
-            executor.submit(function, *chunk): idx for idx, chunk in enumerate(args)
-        }
-
-        results = {}
-        for future, idx in futures.items():
-            try:
-                results[idx] = future.result()
-            except Exception as e:
-                results[idx] = f"ERROR: {e}"
-
-    # Return results to parent process
-    print("RESULTS")
-    print(pickle.dumps(results).hex())
+    # Execute function in parallel, sending each batch as it completes. The
+    # workers encode their own results, so they are passed on undecoded
+    executor = (ThreadPoolExecutor if options["io_bound"] else ProcessPoolExecutor)(
+        options["max_workers"]
+    )
+    dispatcher = Dispatcher(
+        executor,
+        function,
+        spill_dir,
+        args,
+        options["max_workers"] or default_workers(options["io_bound"]),
+        options["chunksize"],
+    )
+    try:
+        for results in dispatcher.results():
+            if results:
+                write_frame(channel, ("BATCH", None, results))
+        write_frame(channel, ("DONE", None, None))
+    except BrokenPipeError:
+        # The parent went away, so nothing is waiting on the remaining tasks
+        executor.shutdown(wait=False, cancel_futures=True)
+        os._exit(1)
+    executor.shutdown()
+    channel.close()
     sys.exit(0)
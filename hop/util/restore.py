@@ -0,0 +1,228 @@
+from argparse import ArgumentParser
+import json
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from urllib.parse import quote
+from hop.util import get_collection
+from hop.util.api_helpers import get_session
+from hop.util.hashing import BLOCK_SIZE, file_hash
+
+PROGRESS_INTERVAL = 10
+
+
+class RestoreRun:
+    def __init__(
+        self,
+        start_folder: str,
+        logger: logging.Logger,
+        target: str | None = None,
+        backup_root: str | None = None,
+        verify: bool = True,
+    ):
+        self.start_folder = str(Path(start_folder))
+        self.target = target
+        self.backup_root = backup_root
+        self.logger = logger
+        self.verify = verify
+        self.lock = threading.Lock()
+        self.start_time = time.perf_counter()
+        self.checked, self.restored, self.failed, self.bytes = 0, 0, 0, 0
+
+    def local_path(self, path: str) -> str:
+        if self.target is None:
+            return path
+        relative = os.path.relpath(path, self.start_folder)
+        return os.path.join(self.target, relative)
+
+    def location(self, doc: dict) -> list:
+        # Documents written before the location was stored are mapped with the
+        # folder the backup was run from
+        if "location" in doc:
+            return doc["location"]
+        root = self.backup_root or self.start_folder
+        relative = Path(os.path.relpath(doc["path"], root))
+        return ["backup", *relative.parts]
+
+    def stale(self, doc: dict, local: str) -> bool:
+        try:
+            stat = os.stat(local)
+        except FileNotFoundError:
+            return True
+        if "size" in doc and stat.st_size != doc["size"]:
+            return True
+        return stat.st_mtime < doc["time"]
+
+    def manifest(self) -> list:
+        collection = get_collection("backups", "files")
+        prefix = re.escape(self.start_folder)
+        docs = collection.find({
+            "path": {"$regex": f"^{prefix}({re.escape(os.sep)}|$)"}
+        })
+        pending = []
+        for doc in docs:
+            self.checked += 1
+            local = self.local_path(doc["path"])
+            if self.stale(doc, local):
+                pending.append((doc, local))
+            else:
+                self.logger.debug(f"Skipping {local}: Up to date")
+        return pending
+
+    def download(self, doc: dict, local: str) -> None:
+        url = "/".join([
+            os.environ["API_ADDRESS"],
+            *(quote(part) for part in self.location(doc)),
+        ])
+        part_path = f"{local}.part"
+        info_path = f"{part_path}.json"
+        os.makedirs(os.path.dirname(local) or ".", exist_ok=True)
+        expected = [doc.get("size"), doc["time"], doc.get("hash")]
+        # A partial file left by an interrupted run is only resumed when it was
+        # started for the same backup record, and If-Range makes the server
+        # send the whole file instead if it changed since
+        offset, headers = 0, {}
+        try:
+            with open(info_path) as f:
+                info = json.load(f)
+            if info["expected"] == expected and info["validator"]:
+                offset = os.path.getsize(part_path)
+                headers = {"Range": f"bytes={offset}-", "If-Range": info["validator"]}
+        except (OSError, ValueError, KeyError):
+            pass
+        resp = get_session().get(url, headers=headers if offset else {}, stream=True)
+        if resp.status_code == 416 or (
+            resp.status_code == 206
+            and not resp.headers.get("Content-Range", "").startswith(f"bytes {offset}-")
+        ):
+            resp.close()
+            resp = get_session().get(url, stream=True)
+        written = 0
+        try:
+            resp.raise_for_status()
+            if resp.status_code != 206:
+                validator = resp.headers.get("ETag") or resp.headers.get(
+                    "Last-Modified"
+                )
+                with open(info_path, "w") as f:
+                    json.dump({"expected": expected, "validator": validator}, f)
+            with open(part_path, "ab" if resp.status_code == 206 else "wb") as f:
+                for block in resp.iter_content(BLOCK_SIZE):
+                    f.write(block)
+                    written += len(block)
+        finally:
+            resp.close()
+        if self.verify and doc.get("hash"):
+            if (digest := file_hash(part_path)) != doc["hash"]:
+                os.unlink(part_path)
+                raise ValueError(f"Hash mismatch {digest} != {doc['hash']}")
+        os.replace(part_path, local)
+        os.unlink(info_path)
+        os.utime(local, (doc["time"], doc["time"]))
+        with self.lock:
+            self.restored += 1
+            self.bytes += written
+
+    def progress(self) -> str:
+        elapsed = time.perf_counter() - self.start_time or 1e-9
+        return (
+            f"Checked {self.checked} files, restored {self.restored} "
+            f"({self.bytes / 1024**2:.1f} MB), {self.failed} failed in {elapsed:.1f}s "
+            f"({self.restored / elapsed:.1f} files/s, "
+            f"{self.bytes / 1024**2 / elapsed:.2f} MB/s)"
+        )
+
+
+def restore(
+    start_folder: str,
+    target: str | None = None,
+    backup_root: str | None = None,
+    jobs: int = 8,
+    verify: bool = True,
+    dry_run: bool = False,
+    verbose: bool = False,
+):
+    logger = logging.getLogger("HOP Restore")
+    if not logger.handlers:
+        logger.setLevel(logging.DEBUG if verbose else logging.INFO)
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(logging.Formatter("%(levelname)s - %(message)s"))
+        logger.addHandler(console_handler)
+    logging.getLogger().setLevel(logging.WARNING)
+
+    run = RestoreRun(start_folder, logger, target, backup_root, verify)
+    pending = run.manifest()
+    logger.info(f"{len(pending)} of {run.checked} files need restoring")
+    if dry_run:
+        for _, local in pending:
+            logger.info(f"Would restore {local}")
+        return run
+
+    last_report = time.monotonic()
+    with ThreadPoolExecutor(jobs) as executor:
+        futures = {
+            executor.submit(run.download, doc, local): local for doc, local in pending
+        }
+        for future in as_completed(futures):
+            try:
+                future.result()
+                logger.debug(f"Restored {futures[future]}")
+            except Exception as e:
+                logger.error(f"Failed to restore {futures[future]}: {e}")
+                run.failed += 1
+            if time.monotonic() - last_report >= PROGRESS_INTERVAL:
+                logger.info(run.progress())
+                last_report = time.monotonic()
+    logger.info(run.progress())
+    return run
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Restore backed up files.")
+    parser.add_argument(
+        "start_folder", help="The backed up folder (or sub folder) to restore."
+    )
+    parser.add_argument(
+        "--target",
+        help="Restore into this folder instead of the original location.",
+    )
+    parser.add_argument(
+        "--backup-root",
+        help="Folder the backup was run from, for files backed up without a "
+        "stored location (default: start_folder)",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=8,
+        help="Number of files to download in parallel (default: 8)",
+    )
+    parser.add_argument(
+        "--no-verify",
+        action="store_true",
+        help="Skip checking downloaded files against their stored hash",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="List the files that would be restored without downloading",
+    )
+    parser.add_argument(
+        "--verbose",
+        action="store_true",
+        help="Enable verbose output (prints debug information)",
+    )
+    args = parser.parse_args()
+    restore(
+        start_folder=args.start_folder,
+        target=args.target,
+        backup_root=args.backup_root,
+        jobs=args.jobs,
+        verify=not args.no_verify,
+        dry_run=args.dry_run,
+        verbose=args.verbose,
+    )
@@ -0,0 +1,190 @@
+import logging
+from typing import Any, Callable, Iterable
+from pymongo import ASCENDING, DESCENDING, UpdateMany
+from pymongo.client_session import ClientSession
+from pymongo.collection import Collection
+from pymongo.errors import OperationFailure
+
+INDEXES = (
+    [("start_frame", ASCENDING), ("end_frame", ASCENDING)],
+    [("end_frame", ASCENDING), ("start_frame", ASCENDING)],
+    [("shot_number", ASCENDING)],
+)
+_indexed = set()
+_transactions = {}
+
+
+def ensure_indexes(collection: Collection) -> None:
+    key = collection.full_name
+    if key in _indexed:
+        return
+    for keys in INDEXES:
+        collection.create_index(keys)
+    _indexed.add(key)
+
+
+def score(shot: dict, start: int, end: int) -> tuple:
+    return (
+        abs(shot["start_frame"] - start) + abs(shot["end_frame"] - end),
+        abs((shot["end_frame"] - shot["start_frame"]) - (end - start)),
+    )
+
+
+def _exclude(query: dict, exclude: Any) -> dict:
+    if exclude is not None:
+        query["_id"] = {"$ne": exclude}
+    return query
+
+
+def find_overlapping(
+    source: Collection, start: int, end: int, exclude: Any = None
+) -> list:
+    ensure_indexes(source)
+    shots = list(
+        source.find(
+            _exclude({"start_frame": {"$gte": start, "$lte": end}}, exclude)
+        ).sort("start_frame", ASCENDING)
+    )
+    # Shots on the active timeline never overlap each other, so only the
+    # closest shot starting before the range can reach into it
+    before = next(
+        source
+        .find(_exclude({"start_frame": {"$lt": start}}, exclude))
+        .sort("start_frame", DESCENDING)
+        .limit(1),
+        None,
+    )
+    if before is not None and before["end_frame"] >= start:
+        shots.insert(0, before)
+    return shots
+
+
+def find_containing(
+    source: Collection, start: int, end: int, exclude: Any = None
+) -> list:
+    ensure_indexes(source)
+    before = next(
+        source
+        .find(_exclude({"start_frame": {"$lte": start}}, exclude))
+        .sort("start_frame", DESCENDING)
+        .limit(1),
+        None,
+    )
+    return [before] if before is not None and before["end_frame"] >= end else []
+
+
+def find_contained(
+    source: Collection, start: int, end: int, exclude: Any = None
+) -> list:
+    ensure_indexes(source)
+    return list(
+        source.find(
+            _exclude(
+                {
+                    "start_frame": {"$gte": start, "$lte": end},
+                    "end_frame": {"$lte": end},
+                },
+                exclude,
+            )
+        ).sort("start_frame", ASCENDING)
+    )
+
+
+def find_nearest(source: Collection, start: int, end: int) -> dict | None:
+    ensure_indexes(source)
+    neighbours = [
+        shot
+        for shot in (
+            next(
+                source
+                .find({"start_frame": {"$lte": start}})
+                .sort("start_frame", DESCENDING)
+                .limit(1),
+                None,
+            ),
+            next(
+                source
+                .find({"start_frame": {"$gt": start}})
+                .sort("start_frame", ASCENDING)
+                .limit(1),
+                None,
+            ),
+        )
+        if shot is not None
+    ]
+    if not neighbours:
+        return None
+    # Any closer shot has to start within the best distance found so far,
+    # which bounds the index scan to that window
+    distance = min(score(shot, start, end)[0] for shot in neighbours)
+    candidates = source.find({
+        "start_frame": {"$gte": start - distance, "$lte": start + distance}
+    }).sort("start_frame", ASCENDING)
+    return min(candidates, key=lambda shot: score(shot, start, end))
+
+
+def get_logger() -> logging.Logger:
+    logger = logging.getLogger("HOP Timeline")
+    if not logger.handlers:
+        logger.setLevel(logging.INFO)
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(logging.Formatter("%(levelname)s - %(message)s"))
+        logger.addHandler(console_handler)
+    return logger
+
+
+def supports_transactions(collection: Collection) -> bool:
+    client = collection.database.client
+    key = id(client)
+    if key not in _transactions:
+        try:
+            hello = client.admin.command("hello")
+        except OperationFailure:
+            # Servers before 4.4.2 have no hello command, and are treated as
+            # standalone rather than guessed from the older isMaster reply
+            hello = {}
+        _transactions[key] = "setName" in hello or hello.get("msg") == "isdbgrid"
+    return _transactions[key]
+
+
+def run_transaction(
+    collection: Collection, callback: Callable[[ClientSession | None], Any]
+) -> Any:
+    if not supports_transactions(collection):
+        return callback(None)
+    with collection.database.client.start_session() as session:
+        return session.with_transaction(callback)
+
+
+def shift_shot_numbers(
+    collection: Collection,
+    query: dict,
+    delta: int,
+    session: ClientSession | None = None,
+) -> int:
+    return collection.update_many(
+        query, {"$inc": {"shot_number": delta}}, session=session
+    ).modified_count
+
+
+def close_shot_number_gaps(
+    collection: Collection,
+    removed_numbers: Iterable[int],
+    session: ClientSession | None = None,
+) -> int:
+    removed = sorted(set(removed_numbers))
+    if not removed:
+        return 0
+    # Ranges are shifted lowest first so no shot is ever pushed into a range
+    # that still has to be shifted
+    operations = []
+    for count, low in enumerate(removed):
+        query = {"$gt": low}
+        if count + 1 < len(removed):
+            query["$lt"] = removed[count + 1]
+        operations.append(
+            UpdateMany({"shot_number": query}, {"$inc": {"shot_number": -(count + 1)}})
+        )
+    return collection.bulk_write(
+        operations, ordered=True, session=session
+    ).modified_count
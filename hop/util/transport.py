@@ -0,0 +1,190 @@
+import mmap
+import os
+import pickle
+import tempfile
+import time
+import traceback
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, BrokenExecutor, Executor, wait
+
+HEADER_SIZE = 4
+SPILL_SIZE = 1024 * 1024
+# Batches are sized to run about this long, which hides the per future cost
+BATCH_SECONDS = 0.05
+# Batches queued per worker, so no worker idles between batches
+QUEUED_BATCHES = 2
+POLL_INTERVAL = 0.1
+INLINE = b"I"
+SPILLED = b"S"
+
+
+def dumps(obj, spill_dir: str | None = None) -> bytes:
+    # Large out-of-band buffers, such as NumPy arrays, are written once to a
+    # file the reader maps, so only a small header crosses the pipe
+    if spill_dir is not None:
+        buffers = []
+        data = pickle.dumps(obj, protocol=5, buffer_callback=buffers.append)
+        views = [buffer.raw() for buffer in buffers]
+        if sum(view.nbytes for view in views) >= SPILL_SIZE:
+            fd, path = tempfile.mkstemp(dir=spill_dir, suffix=".spill")
+            with open(fd, "wb") as f:
+                for view in views:
+                    f.write(view)
+            sizes = [view.nbytes for view in views]
+            return SPILLED + pickle.dumps((data, path, sizes), protocol=5)
+        if not buffers:
+            return INLINE + data
+    return INLINE + pickle.dumps(obj, protocol=5)
+
+
+def loads(payload: bytes):
+    view = memoryview(payload)
+    if view[:1] == INLINE:
+        return pickle.loads(view[1:])
+    data, path, sizes = pickle.loads(view[1:])
+    with open(path, "rb") as f:
+        # Copy on write keeps the arrays writable without touching the file
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    # Windows cannot remove a mapped file, which is left to the run cleanup
+    if os.name != "nt":
+        os.unlink(path)
+    mapped_view = memoryview(mapped)
+    buffers, offset = [], 0
+    for size in sizes:
+        buffers.append(mapped_view[offset : offset + size])
+        offset += size
+    return pickle.loads(data, buffers=buffers)
+
+
+def write_frame(channel, frame: tuple) -> None:
+    payload = pickle.dumps(frame, protocol=5)
+    channel.write(len(payload).to_bytes(HEADER_SIZE, "big") + payload)
+    channel.flush()
+
+
+def read_frame(channel) -> tuple | None:
+    header = channel.read(HEADER_SIZE)
+    if len(header) < HEADER_SIZE:
+        return None
+    size = int.from_bytes(header, "big")
+    payload = channel.read(size)
+    if len(payload) < size:
+        return None
+    return pickle.loads(payload)
+
+
+def failure(e: BaseException, formatted: str = "") -> dict:
+    return {"type": type(e).__name__, "message": str(e), "traceback": formatted}
+
+
+def run_batch(function, spill_dir: str | None, batch: list) -> tuple[list, float]:
+    # Runs inside the pool worker, so results are encoded where they are made
+    # and failures never travel as result values
+    results = []
+    start = time.perf_counter()
+    for idx, args in batch:
+        try:
+            results.append(("RESULT", idx, dumps(function(*args), spill_dir)))
+        except Exception as e:
+            results.append(("FAILED", idx, failure(e, traceback.format_exc())))
+    return results, time.perf_counter() - start
+
+
+def default_workers(io_bound: bool = False) -> int:
+    # Matches the executors' own defaults
+    cpus = os.cpu_count() or 1
+    return min(32, cpus + 4) if io_bound else cpus
+
+
+def auto_chunksize(task_seconds: float, remaining: int, workers: int) -> int:
+    by_time = int(BATCH_SECONDS / max(task_seconds, 1e-6))
+    # Large batches at the end of a run would leave workers idle
+    by_balance = remaining // (workers * QUEUED_BATCHES * 2)
+    return max(1, min(by_time, by_balance))
+
+
+class Dispatcher:
+    def __init__(
+        self,
+        executor: Executor,
+        function,
+        spill_dir: str | None,
+        args: list,
+        workers: int,
+        chunksize: int | None = None,
+    ):
+        self.executor = executor
+        self.function = function
+        self.spill_dir = spill_dir
+        self.queued = deque(enumerate(args))
+        self.workers = workers
+        self.chunksize = chunksize
+        self.size = chunksize or 1
+        self.task_seconds = None
+        self.in_flight = {}
+        self.broken = False
+
+    def submit(self) -> None:
+        while self.queued and len(self.in_flight) < self.workers * QUEUED_BATCHES:
+            batch = [
+                self.queued.popleft() for _ in range(min(self.size, len(self.queued)))
+            ]
+            try:
+                future = self.executor.submit(
+                    run_batch, self.function, self.spill_dir, batch
+                )
+            except BaseException:
+                self.queued.extendleft(reversed(batch))
+                raise
+            self.in_flight[future] = batch
+
+    def measure(self, count: int, seconds: float) -> None:
+        # Without a fixed chunk size, batches grow from single tasks as the
+        # measured time per task settles
+        if self.chunksize or not count:
+            return
+        task_seconds = seconds / count
+        if self.task_seconds is not None:
+            task_seconds = (self.task_seconds + task_seconds) / 2
+        self.task_seconds = task_seconds
+        self.size = auto_chunksize(task_seconds, len(self.queued), self.workers)
+
+    def results(self):
+        # Yields a list per poll, empty while nothing finished, so the caller
+        # can check for cancellation between them
+        while self.queued or self.in_flight:
+            try:
+                self.submit()
+            except (BrokenExecutor, RuntimeError) as e:
+                self.broken = True
+                yield [("FAILED", idx, failure(e)) for idx, _ in self.queued]
+                self.queued.clear()
+            done, _ = wait(self.in_flight, POLL_INTERVAL, FIRST_COMPLETED)
+            results = []
+            for future in done:
+                batch = self.in_flight.pop(future)
+                try:
+                    batch_results, seconds = future.result()
+                except Exception as e:
+                    self.broken |= isinstance(e, BrokenExecutor)
+                    batch_results = [("FAILED", idx, failure(e)) for idx, _ in batch]
+                else:
+                    self.measure(len(batch), seconds)
+                results.extend(batch_results)
+            yield results
+
+    def cancel(self) -> bool:
+        self.queued.clear()
+        running = False
+        for future in self.in_flight:
+            running |= not future.cancel()
+        self.in_flight.clear()
+        return running
+
+
+class TaskError(RuntimeError):
+    def __init__(self, type: str, message: str, traceback: str = ""):
+        super().__init__(f"{type}: {message}")
+        self.type = type
+        self.message = message
+        self.traceback = traceback
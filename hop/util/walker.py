@@ -0,0 +1,110 @@
+import fnmatch
+import logging
+import os
+import re
+from typing import Iterable, Iterator
+
+
+class IgnoreRules:
+    def __init__(
+        self,
+        folders: Iterable[str] = (),
+        folder_names: Iterable[str] = (),
+        file_types: Iterable[str] = (),
+        globs: Iterable[str] = (),
+    ):
+        # Relative paths are matched against both folders and files, the
+        # remaining rules are compiled once so each entry costs a single lookup
+        self.paths = {
+            os.path.normpath(folder).strip(os.sep) for folder in folders if folder
+        }
+        self.folder_names = {name.lower() for name in folder_names}
+        self.file_types = tuple(file_type.lower() for file_type in file_types)
+        globs = list(globs)
+        self.globs = (
+            re.compile("|".join(fnmatch.translate(glob) for glob in globs))
+            if globs
+            else None
+        )
+
+    def __bool__(self) -> bool:
+        return bool(self.paths or self.folder_names or self.file_types or self.globs)
+
+    def _match_glob(self, relative: str, name: str) -> bool:
+        return self.globs is not None and bool(
+            self.globs.match(name) or self.globs.match(relative.replace(os.sep, "/"))
+        )
+
+    def skip_folder(self, relative: str, name: str) -> str | None:
+        if name.lower() in self.folder_names:
+            return "Ignored folder name"
+        if relative in self.paths:
+            return "Ignored path"
+        if self._match_glob(relative, name):
+            return "Ignored pattern"
+        return None
+
+    def skip_file(self, relative: str, name: str) -> str | None:
+        if relative in self.paths:
+            return "Ignored path"
+        if self.file_types and name.lower().endswith(self.file_types):
+            return "Ignored file type"
+        if self._match_glob(relative, name):
+            return "Ignored pattern"
+        return None
+
+
+def _scan(
+    folder: str,
+    relative: str,
+    rules: IgnoreRules | None,
+    logger: logging.Logger | None,
+) -> tuple[list[os.DirEntry], list[tuple[os.DirEntry, str]]]:
+    files, folders = [], []
+    try:
+        entries = list(os.scandir(folder))
+    except OSError as e:
+        if logger is not None:
+            logger.warning(f"Skipping {folder}: {e}")
+        return files, folders
+    for entry in entries:
+        entry_relative = os.path.join(relative, entry.name) if relative else entry.name
+        try:
+            is_folder = entry.is_dir(follow_symlinks=False)
+            # Links to files are listed like the files they point to, as with
+            # os.walk, while linked folders are never descended into and
+            # dangling links have nothing to read
+            is_file = not is_folder and entry.is_file()
+        except OSError:
+            continue
+        if not (is_folder or is_file):
+            continue
+        if rules:
+            check = rules.skip_folder if is_folder else rules.skip_file
+            if reason := check(entry_relative, entry.name):
+                if logger is not None:
+                    logger.debug(f"Skipping {entry.path}: {reason}")
+                continue
+        if is_folder:
+            folders.append((entry, entry_relative))
+        else:
+            files.append(entry)
+    return files, folders
+
+
+def walk(
+    root: str,
+    rules: IgnoreRules | None = None,
+    topdown: bool = True,
+    logger: logging.Logger | None = None,
+    _relative: str = "",
+) -> Iterator[tuple[str, list[os.DirEntry]]]:
+    # Ignored folders are dropped before they are scanned, and every yielded
+    # DirEntry keeps its cached stat for the caller
+    files, folders = _scan(root, _relative, rules, logger)
+    if topdown:
+        yield root, files
+    for entry, relative in folders:
+        yield from walk(entry.path, rules, topdown, logger, relative)
+    if not topdown:
+        yield root, files
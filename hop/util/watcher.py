@@ -0,0 +1,168 @@
+import logging
+import os
+import time
+from hop.util.walker import IgnoreRules, walk
+
+try:
+    import inotify_simple
+except ImportError:
+    inotify_simple = None
+
+
+class PollingWatcher:
+    def __init__(
+        self,
+        root: str,
+        rules: IgnoreRules | None = None,
+        interval: float = 60,
+        logger: logging.Logger | None = None,
+    ):
+        self.root = root
+        self.rules = rules
+        self.interval = interval
+        self.logger = logger
+        self.overflowed = False
+        self.last_poll = 0.0
+        self.snapshot = self._scan()
+
+    def _scan(self) -> dict:
+        return {
+            entry.path: (entry.stat().st_mtime_ns, entry.stat().st_size)
+            for _, files in walk(self.root, self.rules, logger=self.logger)
+            for entry in files
+        }
+
+    def read(self, timeout: float) -> set:
+        wait = self.last_poll + self.interval - time.monotonic()
+        if wait > timeout:
+            time.sleep(timeout)
+            return set()
+        time.sleep(max(wait, 0))
+        self.last_poll = time.monotonic()
+        snapshot = self._scan()
+        changed = {
+            path for path, state in snapshot.items() if self.snapshot.get(path) != state
+        }
+        self.snapshot = snapshot
+        return changed
+
+    def close(self) -> None:
+        pass
+
+
+class InotifyWatcher:
+    def __init__(
+        self,
+        root: str,
+        rules: IgnoreRules | None = None,
+        logger: logging.Logger | None = None,
+    ):
+        flags = inotify_simple.flags
+        self.file_mask = flags.CLOSE_WRITE | flags.MOVED_TO | flags.ATTRIB
+        self.mask = self.file_mask | flags.CREATE | flags.DELETE_SELF
+        self.root = root
+        self.rules = rules
+        self.logger = logger
+        self.overflowed = False
+        self.inotify = inotify_simple.INotify()
+        self.folders = {}
+        self._watch(root)
+
+    def _watch(self, folder: str) -> set:
+        # Ignored subtrees are pruned by the walker, so they are never watched
+        found = set()
+        for path, files in walk(folder, self.rules, logger=self.logger):
+            try:
+                descriptor = self.inotify.add_watch(path, self.mask)
+            except OSError as e:
+                if self.logger is not None:
+                    self.logger.warning(f"Unable to watch {path}: {e}")
+                continue
+            self.folders[descriptor] = path
+            found.update(entry.path for entry in files)
+        return found
+
+    def _relative(self, path: str) -> str:
+        return os.path.relpath(path, self.root)
+
+    def read(self, timeout: float) -> set:
+        flags = inotify_simple.flags
+        changed = set()
+        for event in self.inotify.read(timeout=int(timeout * 1000)):
+            if event.mask & flags.Q_OVERFLOW:
+                self.overflowed = True
+                continue
+            folder = self.folders.get(event.wd)
+            if folder is None:
+                continue
+            if event.mask & (flags.IGNORED | flags.DELETE_SELF):
+                self.folders.pop(event.wd, None)
+                continue
+            path = os.path.join(folder, event.name)
+            if event.mask & flags.ISDIR:
+                if event.mask & (flags.CREATE | flags.MOVED_TO) and not (
+                    self.rules
+                    and self.rules.skip_folder(self._relative(path), event.name)
+                ):
+                    changed.update(self._watch(path))
+                continue
+            if event.mask & self.file_mask and not (
+                self.rules and self.rules.skip_file(self._relative(path), event.name)
+            ):
+                changed.add(path)
+        return changed
+
+    def close(self) -> None:
+        self.inotify.close()
+
+
+def watcher(
+    root: str,
+    rules: IgnoreRules | None = None,
+    interval: float = 60,
+    logger: logging.Logger | None = None,
+) -> InotifyWatcher | PollingWatcher:
+    if inotify_simple is not None:
+        try:
+            return InotifyWatcher(root, rules, logger)
+        except OSError as e:
+            if logger is not None:
+                logger.warning(f"Falling back to polling: {e}")
+    elif logger is not None:
+        logger.info("inotify_simple is not installed, polling for changes")
+    return PollingWatcher(root, rules, interval, logger)
+
+
+class Debouncer:
+    def __init__(self, quiet: float = 2, max_wait: float = 30, max_pending=10000):
+        self.quiet = quiet
+        self.max_wait = max_wait
+        self.max_pending = max_pending
+        self.pending = {}
+        self.first = None
+
+    def add(self, paths: set) -> None:
+        now = time.monotonic()
+        if paths and self.first is None:
+            self.first = now
+        for path in paths:
+            self.pending[path] = now
+
+    def ready(self) -> list:
+        # Bursts such as caches writing frames are held until they go quiet,
+        # but never longer than max_wait or past max_pending entries
+        if not self.pending:
+            return []
+        now = time.monotonic()
+        if now - self.first >= self.max_wait or len(self.pending) >= self.max_pending:
+            ready = list(self.pending)
+            self.pending.clear()
+        else:
+            ready = [
+                path for path, last in self.pending.items() if now - last >= self.quiet
+            ]
+            for path in ready:
+                del self.pending[path]
+        if not self.pending:
+            self.first = None
+        return ready
@@ -0,0 +1,251 @@
+import hashlib
+import importlib
+import json
+import os
+import pickle
+import secrets
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Connection, Listener
+
+if __package__:
+    from hop.util.transport import Dispatcher, default_workers, loads
+else:
+    # Run as the service script, which only has this folder on its path
+    from transport import Dispatcher, default_workers, loads
+
+IDLE_TIMEOUT = float(os.environ.get("HOP_WORKER_IDLE", 900))
+START_TIMEOUT = 30
+# Shared by every io_bound request, each limited to its own max_workers
+THREAD_WORKERS = 64
+REGISTRY = os.path.join(tempfile.gettempdir(), "hop_workers")
+
+_lock = threading.Lock()
+
+
+def registry_path(interpreter: str, owner: int | None = None) -> str:
+    # One service per owning session, interpreter and import path, so a
+    # changed sys.path never reuses workers that cannot see the new modules
+    owner = os.getpid() if owner is None else owner
+    key = hashlib.blake2b(
+        "\0".join([os.path.abspath(interpreter), *sys.path]).encode(), digest_size=8
+    ).hexdigest()
+    return os.path.join(REGISTRY, f"{owner}_{key}.json")
+
+
+def _connect(path: str) -> Connection | None:
+    try:
+        with open(path) as f:
+            info = json.load(f)
+        return Client(info["address"], authkey=bytes.fromhex(info["authkey"]))
+    except (OSError, ValueError, KeyError, EOFError, AuthenticationError):
+        return None
+
+
+def connect(interpreter: str, env: dict | None = None) -> Connection:
+    path = registry_path(interpreter)
+    with _lock:
+        if (connection := _connect(path)) is not None:
+            return connection
+        os.makedirs(REGISTRY, exist_ok=True)
+        if os.path.exists(path):
+            os.unlink(path)
+        script_file = str(__file__)
+        if not script_file.endswith(".py"):
+            script_file += ".py"
+        with open(f"{path[:-5]}.log", "ab") as log:
+            subprocess.Popen(
+                (interpreter, script_file, path, str(IDLE_TIMEOUT), str(os.getpid())),
+                stdin=subprocess.DEVNULL,
+                stdout=log,
+                stderr=log,
+                env=env,
+                start_new_session=os.name != "nt",
+                creationflags=(
+                    subprocess.CREATE_NO_WINDOW | subprocess.DETACHED_PROCESS
+                    if os.name == "nt"
+                    else 0
+                ),
+            )
+        deadline = time.monotonic() + START_TIMEOUT
+        while time.monotonic() < deadline:
+            if (connection := _connect(path)) is not None:
+                return connection
+            time.sleep(0.05)
+    raise RuntimeError(f"Worker service for {interpreter} did not start")
+
+
+def owner_alive(owner: int) -> bool:
+    # os.kill terminates the process on Windows, so only the idle timeout
+    # applies there
+    if os.name == "nt":
+        return True
+    try:
+        os.kill(owner, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class WorkerService:
+    def __init__(self, registry: str, idle_timeout: float, owner: int):
+        self.registry = registry
+        self.idle_timeout = idle_timeout
+        self.owner = owner
+        self.pool = ProcessPoolExecutor()
+        self.threads = ThreadPoolExecutor(THREAD_WORKERS)
+        self.lock = threading.Lock()
+        self.active = 0
+        self.requests = 0
+        self.last_used = time.monotonic()
+
+    def run(self) -> None:
+        authkey = secrets.token_bytes(32)
+        listener = Listener(authkey=authkey)
+        temp_path = f"{self.registry}.{os.getpid()}"
+        with open(os.open(temp_path, os.O_WRONLY | os.O_CREAT, 0o600), "w") as f:
+            json.dump(
+                {
+                    "address": listener.address,
+                    "authkey": authkey.hex(),
+                    "pid": os.getpid(),
+                },
+                f,
+            )
+        os.replace(temp_path, self.registry)
+        threading.Thread(target=self.watchdog, daemon=True).start()
+        while True:
+            try:
+                connection = listener.accept()
+            except (OSError, EOFError, AuthenticationError):
+                continue
+            threading.Thread(
+                target=self.handle, args=(connection,), daemon=True
+            ).start()
+
+    def handle(self, connection: Connection) -> None:
+        with self.lock:
+            self.active += 1
+        try:
+            with connection:
+                while True:
+                    try:
+                        request = connection.recv()
+                    except (EOFError, OSError):
+                        break
+                    self.execute(connection, *request)
+        finally:
+            with self.lock:
+                self.active -= 1
+                self.last_used = time.monotonic()
+
+    def execute(
+        self,
+        connection: Connection,
+        module_name: str,
+        function_name: str,
+        args: bytes,
+        spill_dir: str,
+        options: dict,
+    ) -> None:
+        # Workers stay alive between requests, so each one only imports the
+        # target module the first time it runs a task from it
+        try:
+            function = getattr(importlib.import_module(module_name), function_name)
+            args = loads(args)
+        except (ImportError, AttributeError, OSError, pickle.UnpicklingError) as e:
+            connection.send((
+                "ERROR",
+                None,
+                f"Failed to load {module_name}.{function_name} or its arguments: {e}",
+            ))
+            return
+        # The pools are shared, so max_workers limits the batches in flight
+        # instead of sizing a pool
+        with self.lock:
+            pool = self.threads if options["io_bound"] else self.pool
+            self.requests += 1
+        dispatcher = Dispatcher(
+            pool,
+            function,
+            spill_dir,
+            args,
+            options["max_workers"] or default_workers(options["io_bound"]),
+            options["chunksize"],
+        )
+        try:
+            for results in dispatcher.results():
+                if results:
+                    connection.send(("BATCH", None, results))
+                # Anything from the client mid request is a cancel, including
+                # the end of file of a closed connection
+                if connection.poll():
+                    break
+            else:
+                connection.send(("DONE", None, None))
+                return
+        except (OSError, EOFError):
+            pass
+        finally:
+            with self.lock:
+                self.requests -= 1
+            if dispatcher.broken:
+                self.replace_pool(pool)
+        self.cancel(pool, dispatcher)
+        try:
+            connection.recv()
+            connection.send(("CANCELLED", None, None))
+        except (OSError, EOFError):
+            pass
+
+    def replace_pool(self, pool: ProcessPoolExecutor) -> None:
+        with self.lock:
+            if self.pool is not pool:
+                return
+            self.pool = ProcessPoolExecutor()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def cancel(self, pool: ProcessPoolExecutor, dispatcher: Dispatcher) -> None:
+        running = dispatcher.cancel()
+        with self.lock:
+            shared = self.requests > 0
+        # Tasks already running can only be stopped by killing their
+        # workers, which is left alone while other requests share the pool.
+        # Threads cannot be killed, so io_bound tasks run to completion
+        if shared or not running or pool is self.threads:
+            return
+        processes = list((getattr(pool, "_processes", None) or {}).values())
+        self.replace_pool(pool)
+        for process in processes:
+            process.terminate()
+
+    def watchdog(self) -> None:
+        while True:
+            time.sleep(1)
+            with self.lock:
+                idle = (
+                    not self.active
+                    and time.monotonic() - self.last_used > self.idle_timeout
+                )
+            if idle or not owner_alive(self.owner):
+                self.stop()
+
+    def stop(self) -> None:
+        try:
+            os.unlink(self.registry)
+        except FileNotFoundError:
+            pass
+        self.pool.shutdown(cancel_futures=True)
+        os._exit(0)
+
+
+if __name__ == "__main__":
+    registry, idle_timeout, owner = sys.argv[1:]
+    WorkerService(registry, float(idle_timeout), int(owner)).run()
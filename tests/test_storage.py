@@ -0,0 +1,76 @@
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "hop", "api"))
+from storage import LocalStorage  # noqa: E402
+
+
+def make_session(storage: LocalStorage, upload_id: str, age: float) -> str:
+    storage._create_session(
+        upload_id,
+        {
+            "upload_id": upload_id,
+            "location": ["backup"],
+            "file_name": "plate.exr",
+            "size": 1024,
+            "chunk_size": 512,
+        },
+    )
+    used = time.time() - age
+    folder = storage.session_path(upload_id)
+    for root, folders, files in os.walk(folder, topdown=False):
+        for name in files:
+            os.utime(os.path.join(root, name), (used, used))
+        os.utime(root, (used, used))
+    return folder
+
+
+def test_sweep_sessions_removes_stale_sessions(tmp_path):
+    storage = LocalStorage(str(tmp_path), session_ttl=3600)
+    fresh = make_session(storage, "fresh", 60)
+    stale = make_session(storage, "stale", 7200)
+
+    assert storage._sweep_sessions() == 1
+    assert not os.path.exists(stale)
+    assert os.path.exists(fresh)
+
+
+def test_create_session_sweeps_stale_sessions(tmp_path):
+    storage = LocalStorage(str(tmp_path), session_ttl=3600)
+    stale = make_session(storage, "stale", 7200)
+
+    make_session(storage, "new", 0)
+    assert not os.path.exists(stale)
+
+
+def test_written_chunk_keeps_session_fresh(tmp_path):
+    storage = LocalStorage(str(tmp_path), session_ttl=3600)
+    folder = make_session(storage, "running", 7200)
+    open(storage.session_path("running", "chunks", "0"), "w").close()
+
+    assert storage._sweep_sessions() == 0
+    assert os.path.exists(folder)
+
+
+def test_commit_survives_released_blob(tmp_path):
+    storage = LocalStorage(str(tmp_path))
+    first = storage.path(["backup", "a.txt"])
+    storage._store(first, io.BytesIO(b"plate"))
+    link_temp = storage._link_temp
+
+    def release_first(blob: str, save_path: str) -> str:
+        # Another request deletes the only other path between the two links
+        storage._delete(first)
+        storage._link_temp = link_temp
+        return link_temp(blob, save_path)
+
+    storage._link_temp = release_first
+    second = storage.path(["backup", "b.txt"])
+    storage._store(second, io.BytesIO(b"plate"))
+
+    with open(second, "rb") as f:
+        assert f.read() == b"plate"
+    assert storage._delete(second)
+    assert storage._sweep() == 0